@@ -13,6 +13,11 @@ DEFAULT_DRIVE_DESTINATION = "drive"
 DEFAULT_PHOTOS_DESTINATION = "photos"
 DEFAULT_RETRY_LOGIN_INTERVAL_SEC = 600  # 10 minutes
 DEFAULT_SYNC_INTERVAL_SEC = 1800  # 30 minutes
+DEFAULT_MAX_CONCURRENT_DOWNLOADS = 4
+DEFAULT_MAX_CONCURRENT_LISTINGS = 4
+DEFAULT_LISTING_BATCH_SIZE = 50
+DEFAULT_MAX_CONCURRENT_EXTRACTIONS = 2
+DEFAULT_PHOTOS_MAX_CONCURRENT_DOWNLOADS = 4
 DEFAULT_CONFIG_FILE_NAME = "config.yaml"
 ENV_ICLOUD_PASSWORD_KEY = "ENV_ICLOUD_PASSWORD"
 ENV_CONFIG_FILE_PATH_KEY = "ENV_CONFIG_FILE_PATH"
@@ -5,7 +5,12 @@ import os
 
 from src import (
     DEFAULT_DRIVE_DESTINATION,
+    DEFAULT_LISTING_BATCH_SIZE,
+    DEFAULT_MAX_CONCURRENT_DOWNLOADS,
+    DEFAULT_MAX_CONCURRENT_EXTRACTIONS,
+    DEFAULT_MAX_CONCURRENT_LISTINGS,
     DEFAULT_PHOTOS_DESTINATION,
+    DEFAULT_PHOTOS_MAX_CONCURRENT_DOWNLOADS,
     DEFAULT_RETRY_LOGIN_INTERVAL_SEC,
     DEFAULT_ROOT_DESTINATION,
     DEFAULT_SYNC_INTERVAL_SEC,
@@ -106,8 +111,27 @@ def get_photos_all_albums(config):
     return download_all
 
 
-def prepare_root_destination(config):
-    """Prepare root destination."""
+def get_photos_delta_sync(config):
+    """Return flag to sync photos by their changes from config."""
+    delta_sync = False
+    config_path = ["photos", "delta_sync"]
+    if traverse_config_path(config=config, config_path=config_path):
+        delta_sync = get_config_value(config=config, config_path=config_path)
+        LOGGER.info("Syncing photos by their changes.")
+    return delta_sync
+
+
+def get_dry_run(config):
+    """Return flag to only plan the sync from config."""
+    dry_run = False
+    config_path = ["app", "dry_run"]
+    if traverse_config_path(config=config, config_path=config_path):
+        dry_run = get_config_value(config=config, config_path=config_path)
+    return dry_run
+
+
+def prepare_root_destination(config, create=True):
+    """Prepare root destination, create it unless told otherwise."""
     LOGGER.debug("Checking root destination ...")
     root_destination = DEFAULT_ROOT_DESTINATION
     config_path = ["app", "root"]
@@ -119,7 +143,8 @@ def prepare_root_destination(config):
     else:
         root_destination = get_config_value(config=config, config_path=config_path)
     root_destination_path = os.path.abspath(root_destination)
-    os.makedirs(root_destination_path, exist_ok=True)
+    if create:
+        os.makedirs(root_destination_path, exist_ok=True)
     return root_destination_path
 
 
@@ -204,8 +229,8 @@ def get_smtp_no_tls(config):
     return no_tls
 
 
-def prepare_drive_destination(config):
-    """Prepare drive destination path."""
+def prepare_drive_destination(config, create=True):
+    """Prepare drive destination path, create it unless told otherwise."""
     LOGGER.debug("Checking drive destination ...")
     config_path = ["drive", "destination"]
     drive_destination = DEFAULT_DRIVE_DESTINATION
@@ -217,9 +242,12 @@ def prepare_drive_destination(config):
     else:
         drive_destination = get_config_value(config=config, config_path=config_path)
     drive_destination_path = os.path.abspath(
-        os.path.join(prepare_root_destination(config=config), drive_destination)
+        os.path.join(
+            prepare_root_destination(config=config, create=create), drive_destination
+        )
     )
-    os.makedirs(drive_destination_path, exist_ok=True)
+    if create:
+        os.makedirs(drive_destination_path, exist_ok=True)
     return drive_destination_path
 
 
@@ -240,8 +268,102 @@ def get_drive_remove_obsolete(config):
     return drive_remove_obsolete
 
 
-def prepare_photos_destination(config):
-    """Prepare photos destination path."""
+def get_positive_integer(config, config_path, default):
+    """Return positive integer config value or the default."""
+    value = default
+    if not traverse_config_path(config=config, config_path=config_path):
+        LOGGER.debug(
+            f"{config_path_to_string(config_path=config_path)} not found. Using default value - {default} ..."
+        )
+    else:
+        config_value = get_config_value(config=config, config_path=config_path)
+        if (
+            isinstance(config_value, int)
+            and not isinstance(config_value, bool)
+            and config_value > 0
+        ):
+            value = config_value
+        else:
+            LOGGER.error(
+                f"{config_path_to_string(config_path=config_path)} is invalid. "
+                + f"Valid value is a positive integer. Using default value - {default} ..."
+            )
+    return value
+
+
+def get_drive_max_concurrent_downloads(config):
+    """Return maximum number of concurrent drive downloads from config."""
+    max_concurrent_downloads = get_positive_integer(
+        config=config,
+        config_path=["drive", "max_concurrent_downloads"],
+        default=DEFAULT_MAX_CONCURRENT_DOWNLOADS,
+    )
+    LOGGER.debug(
+        f"Downloading up to {max_concurrent_downloads} drive files concurrently."
+    )
+    return max_concurrent_downloads
+
+
+def get_drive_max_concurrent_listings(config):
+    """Return maximum number of concurrent drive folder listings from config."""
+    max_concurrent_listings = get_positive_integer(
+        config=config,
+        config_path=["drive", "max_concurrent_listings"],
+        default=DEFAULT_MAX_CONCURRENT_LISTINGS,
+    )
+    LOGGER.debug(f"Listing up to {max_concurrent_listings} drive folders concurrently.")
+    return max_concurrent_listings
+
+
+def get_drive_listing_batch_size(config):
+    """Return number of drive folders retrieved per request from config."""
+    listing_batch_size = get_positive_integer(
+        config=config,
+        config_path=["drive", "listing_batch_size"],
+        default=DEFAULT_LISTING_BATCH_SIZE,
+    )
+    LOGGER.debug(f"Retrieving up to {listing_batch_size} drive folders per request.")
+    return listing_batch_size
+
+
+def get_drive_max_concurrent_extractions(config):
+    """Return maximum number of concurrent package member extractions from config."""
+    max_concurrent_extractions = get_positive_integer(
+        config=config,
+        config_path=["drive", "max_concurrent_extractions"],
+        default=DEFAULT_MAX_CONCURRENT_EXTRACTIONS,
+    )
+    LOGGER.debug(
+        f"Extracting up to {max_concurrent_extractions} package members in parallel."
+    )
+    return max_concurrent_extractions
+
+
+def get_photos_max_concurrent_downloads(config):
+    """Return maximum number of concurrent photo downloads from config."""
+    max_concurrent_downloads = get_positive_integer(
+        config=config,
+        config_path=["photos", "max_concurrent_downloads"],
+        default=DEFAULT_PHOTOS_MAX_CONCURRENT_DOWNLOADS,
+    )
+    LOGGER.debug(f"Downloading up to {max_concurrent_downloads} photos concurrently.")
+    return max_concurrent_downloads
+
+
+def get_photos_full_sync_interval(config):
+    """Return interval between full photo syncs from config, or None to always sync all."""
+    full_sync_interval = get_positive_integer(
+        config=config,
+        config_path=["photos", "full_sync_interval"],
+        default=None,
+    )
+    if full_sync_interval is not None:
+        LOGGER.debug(f"Syncing all photos every {full_sync_interval} seconds.")
+    return full_sync_interval
+
+
+def prepare_photos_destination(config, create=True):
+    """Prepare photos destination path, create it unless told otherwise."""
     LOGGER.debug("Checking photos destination ...")
     config_path = ["photos", "destination"]
     photos_destination = DEFAULT_PHOTOS_DESTINATION
@@ -253,9 +375,12 @@ def prepare_photos_destination(config):
     else:
         photos_destination = get_config_value(config=config, config_path=config_path)
     photos_destination_path = os.path.abspath(
-        os.path.join(prepare_root_destination(config=config), photos_destination)
+        os.path.join(
+            prepare_root_destination(config=config, create=create), photos_destination
+        )
     )
-    os.makedirs(photos_destination_path, exist_ok=True)
+    if create:
+        os.makedirs(photos_destination_path, exist_ok=True)
     return photos_destination_path
 
 
@@ -0,0 +1,75 @@
+"""Compact set of local paths kept by a sync."""
+import threading
+from array import array
+
+MIN_SLOTS = 1024
+KEY_MASK = (1 << 64) - 1
+
+
+def path_key(path):
+    """Return the non-zero 64-bit key of the path."""
+    # 0 marks an empty slot
+    return (hash(path) & KEY_MASK) or 1
+
+
+def insert_key(slots, key):
+    """Insert the key into the table, return False if it was present."""
+    mask = len(slots) - 1
+    index = key & mask
+    while slots[index]:
+        if slots[index] == key:
+            return False
+        index = (index + 1) & mask
+    slots[index] = key
+    return True
+
+
+class KeptPaths:
+    """Set of paths stored as 64-bit keys in an array backed hash table.
+
+    Every path takes 16 bytes instead of a full string in a set. A key
+    collision can only keep an obsolete path, never remove a wanted one.
+    """
+
+    def __init__(self, paths=None):
+        """Create the set with the given paths."""
+        self.lock = threading.Lock()
+        self.count = 0
+        self.slots = array("Q", bytes(8 * MIN_SLOTS))
+        if paths:
+            self.update(paths)
+
+    def __len__(self):
+        """Return the number of paths."""
+        return self.count
+
+    def __contains__(self, path):
+        """Check if the path is kept."""
+        key = path_key(path)
+        # Readers use the table they see, writers swap it in only once filled
+        slots = self.slots
+        mask = len(slots) - 1
+        index = key & mask
+        while slots[index]:
+            if slots[index] == key:
+                return True
+            index = (index + 1) & mask
+        return False
+
+    def add(self, path):
+        """Keep the path."""
+        key = path_key(path)
+        with self.lock:
+            if insert_key(self.slots, key):
+                self.count += 1
+                if self.count * 2 > len(self.slots):
+                    slots = array("Q", bytes(16 * len(self.slots)))
+                    for existing in self.slots:
+                        if existing:
+                            insert_key(slots, existing)
+                    self.slots = slots
+
+    def update(self, paths):
+        """Keep all the paths."""
+        for path in paths:
+            self.add(path)
@@ -1,7 +1,15 @@
 """Main module."""
 __author__ = "Mandar Patil (mandarons@pm.me)"
 
+import argparse
+
 from src import sync
 
 if __name__ == "__main__":
-    sync.sync()
+    parser = argparse.ArgumentParser(description="Sync iCloud Drive and Photos.")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="plan the sync without downloading or removing anything",
+    )
+    sync.sync(dry_run=parser.parse_args().dry_run)
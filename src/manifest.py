@@ -0,0 +1,287 @@
+"""Local manifest of synced items."""
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from src import config_parser
+
+MANIFEST_FILE_NAME = ".manifest.db"
+COMMIT_EVERY = 500
+DRIVE_ITEM_COLUMNS = (
+    "drivewsid",
+    "type",
+    "etag",
+    "size",
+    "modified",
+    "local_path",
+    "is_package",
+)
+PHOTO_COLUMNS = ("photo_id", "version", "local_path", "size", "checksum")
+
+
+def init_manifest(config, create=True):
+    """Return manifest file path in the root destination."""
+    root_destination_path = config_parser.prepare_root_destination(
+        config=config, create=create
+    )
+    return os.path.join(root_destination_path, MANIFEST_FILE_NAME)
+
+
+class Manifest:
+    """SQLite backed record of synced items, shared by the sync workers."""
+
+    def __init__(self, file_path, read_only=False):
+        """Open (and create, if missing) the manifest.
+
+        A read only manifest works on an in-memory copy of the file, so its
+        writes never lock or reach the file that a running sync uses.
+        """
+        self.file_path = file_path
+        self.read_only = read_only
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.connection = sqlite3.connect(
+            ":memory:" if read_only else file_path, check_same_thread=False
+        )
+        if read_only and os.path.isfile(file_path):
+            source = sqlite3.connect(
+                f"{Path(os.path.abspath(file_path)).as_uri()}?mode=ro", uri=True
+            )
+            try:
+                source.backup(self.connection)
+            finally:
+                source.close()
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS drive_items (
+                drivewsid TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                etag TEXT,
+                size INTEGER,
+                modified INTEGER,
+                local_path TEXT NOT NULL,
+                is_package INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS drive_items_local_path ON drive_items (local_path)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS package_members (
+                package_path TEXT NOT NULL,
+                member_path TEXT NOT NULL
+            )"""
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS package_members_package_path "
+            + "ON package_members (package_path)"
+        )
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS photos (
+                photo_id TEXT NOT NULL,
+                version TEXT NOT NULL,
+                local_path TEXT NOT NULL,
+                size INTEGER,
+                checksum TEXT,
+                PRIMARY KEY (photo_id, version, local_path)
+            )"""
+        )
+        self.connection.commit()
+
+    def get_meta(self, key):
+        """Return the recorded value for key or None."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value FROM meta WHERE key = ?", (key,)
+            ).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, key, value):
+        """Record the value for key."""
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+            )
+            self._commit()
+
+    def get_drive_item(self, drivewsid):
+        """Return the recorded drive item or None."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT * FROM drive_items WHERE drivewsid = ?", (drivewsid,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def put_drive_item(self, **item):
+        """Record the drive item."""
+        with self.lock:
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO drive_items ({', '.join(DRIVE_ITEM_COLUMNS)}) "
+                + f"VALUES ({', '.join('?' * len(DRIVE_ITEM_COLUMNS))})",
+                tuple(item.get(column) for column in DRIVE_ITEM_COLUMNS),
+            )
+            self._written()
+
+    def _commit(self):
+        """Commit pending writes, the lock must be held."""
+        if not self.read_only:
+            self.connection.commit()
+
+    def _written(self):
+        """Commit once enough writes are pending, the lock must be held."""
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            self._commit()
+            self.pending = 0
+
+    def get_package_members(self, package_path):
+        """Return the recorded member paths of the package or None."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT member_path FROM package_members WHERE package_path = ?",
+                (package_path,),
+            ).fetchall()
+        return [row["member_path"] for row in rows] if rows else None
+
+    def put_package_members(self, package_path, members):
+        """Record the member paths of the package."""
+        with self.lock:
+            self.connection.execute(
+                "DELETE FROM package_members WHERE package_path = ?", (package_path,)
+            )
+            self.connection.executemany(
+                "INSERT INTO package_members (package_path, member_path) VALUES (?, ?)",
+                ((package_path, member) for member in members),
+            )
+            self._written()
+
+    def get_drive_items_under(self, folder_path):
+        """Return the recorded drive items below the given local folder."""
+        # Every path below folder_path sorts between "folder_path/" and "folder_path0"
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT * FROM drive_items WHERE local_path > ? AND local_path < ?",
+                (folder_path + os.sep, folder_path + chr(ord(os.sep) + 1)),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def move_drive_items(self, previous_path, local_path):
+        """Update the recorded local paths at and below previous_path."""
+        below = (previous_path + os.sep, previous_path + chr(ord(os.sep) + 1))
+        with self.lock:
+            for table, column in (
+                ("drive_items", "local_path"),
+                ("package_members", "package_path"),
+                ("package_members", "member_path"),
+            ):
+                self.connection.execute(
+                    f"UPDATE {table} SET {column} = ? || substr({column}, ?) "
+                    + f"WHERE {column} = ? OR ({column} > ? AND {column} < ?)",
+                    (local_path, len(previous_path) + 1, previous_path) + below,
+                )
+            self._commit()
+
+    def retain_drive_items(self, local_paths):
+        """Forget the drive items whose local path is not in local_paths."""
+        with self.lock:
+            obsolete = [
+                (row["drivewsid"],)
+                for row in self.connection.execute(
+                    "SELECT drivewsid, local_path FROM drive_items"
+                )
+                if row["local_path"] not in local_paths
+            ]
+            self.connection.executemany(
+                "DELETE FROM drive_items WHERE drivewsid = ?", obsolete
+            )
+            self.connection.executemany(
+                "DELETE FROM package_members WHERE package_path = ?",
+                [
+                    (row["package_path"],)
+                    for row in self.connection.execute(
+                        "SELECT DISTINCT package_path FROM package_members"
+                    ).fetchall()
+                    if row["package_path"] not in local_paths
+                ],
+            )
+            self._commit()
+        return len(obsolete)
+
+    def get_photo(self, photo_id, version, local_path):
+        """Return the recorded photo version at local_path or None."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT * FROM photos WHERE photo_id = ? AND version = ? AND local_path = ?",
+                (photo_id, version, local_path),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def put_photo(self, **photo):
+        """Record the photo version."""
+        with self.lock:
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO photos ({', '.join(PHOTO_COLUMNS)}) "
+                + f"VALUES ({', '.join('?' * len(PHOTO_COLUMNS))})",
+                tuple(photo.get(column) for column in PHOTO_COLUMNS),
+            )
+            self._written()
+
+    def retain_photos(self, local_paths):
+        """Forget the photos whose local path is not in local_paths."""
+        with self.lock:
+            obsolete = [
+                (row["local_path"],)
+                for row in self.connection.execute(
+                    "SELECT DISTINCT local_path FROM photos"
+                ).fetchall()
+                if row["local_path"] not in local_paths
+            ]
+            self.connection.executemany(
+                "DELETE FROM photos WHERE local_path = ?", obsolete
+            )
+            self._commit()
+        return len(obsolete)
+
+    def get_photo_copies(self, photo_id, version):
+        """Return the local paths recorded for the photo version."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT local_path FROM photos WHERE photo_id = ? AND version = ?",
+                (photo_id, version),
+            ).fetchall()
+        return [row["local_path"] for row in rows]
+
+    def get_photo_paths(self, photo_ids):
+        """Return the local paths recorded for the photo ids."""
+        with self.lock:
+            return {
+                row["local_path"]
+                for photo_id in photo_ids
+                for row in self.connection.execute(
+                    "SELECT local_path FROM photos WHERE photo_id = ?", (photo_id,)
+                )
+            }
+
+    def forget_photos(self, local_paths):
+        """Forget the photos at the local paths."""
+        with self.lock:
+            self.connection.executemany(
+                "DELETE FROM photos WHERE local_path = ?",
+                [(local_path,) for local_path in local_paths],
+            )
+            self._commit()
+
+    def close(self):
+        """Commit (or discard, if read only) pending changes and close the manifest."""
+        with self.lock:
+            if self.read_only:
+                self.connection.rollback()
+            else:
+                self.connection.commit()
+            self.connection.close()
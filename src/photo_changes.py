@@ -0,0 +1,129 @@
+"""Changes of a photo library since a sync token."""
+import json
+from urllib.parse import urlencode
+
+from icloudpy.services.photos import PhotoAsset
+
+CHANGES_RECORD_TYPES = ["CPLMaster", "CPLAsset"]
+LOOKUP_BATCH_SIZE = 100
+REMOVED_FLAGS = ("isDeleted", "isHidden")
+
+
+def fetch_changes(library, sync_token=None):
+    """Yield the (records, sync token) pages of the library zone changes.
+
+    Without a sync token, every record of the zone is listed.
+    """
+    service = library.service
+    url = (
+        service._service_endpoint  # pylint: disable=protected-access
+        + f"/changes/zone?{urlencode(service.params)}"
+    )
+    while True:
+        zone = {
+            "zoneID": library.zone_id,
+            "desiredRecordTypes": CHANGES_RECORD_TYPES,
+            "reverse": False,
+        }
+        if sync_token is not None:
+            zone["syncToken"] = sync_token
+        request = service.session.post(
+            url,
+            data=json.dumps({"zones": [zone]}),
+            headers={"Content-type": "text/plain"},
+        )
+        zone = request.json()["zones"][0]
+        sync_token = zone["syncToken"]
+        yield zone.get("records", []), sync_token
+        if not zone.get("moreComing"):
+            break
+
+
+def lookup_records(library, record_names):
+    """Return the current records of the library with the given names."""
+    service = library.service
+    request = service.session.post(
+        service._service_endpoint  # pylint: disable=protected-access
+        + f"/records/lookup?{urlencode(service.params)}",
+        data=json.dumps(
+            {
+                "records": [{"recordName": name} for name in record_names],
+                "zoneID": library.zone_id,
+            }
+        ),
+        headers={"Content-type": "text/plain"},
+    )
+    # Missing records come back with a server error code instead
+    return [record for record in request.json()["records"] if "recordType" in record]
+
+
+class LibraryChanges:
+    """Photos changed and removed in a library since a sync token.
+
+    Iterating yields the photos whose master and asset records both changed,
+    and the photos with only a changed asset that the manifest, if given,
+    does not hold, like photos restored from Recently Deleted. Once done,
+    deleted holds the ids of the removed photos, sync_token the token of the
+    next changes and requests the number of requests made.
+    """
+
+    def __init__(self, library, sync_token=None, manifest=None):
+        """Prepare the changes since sync_token, or all photos without one."""
+        self.library = library
+        self.manifest = manifest
+        self.sync_token = sync_token
+        self.deleted = set()
+        self.requests = 0
+
+    def __iter__(self):
+        """Yield the changed photos."""
+        # Records of a photo may come on different pages
+        masters = {}
+        assets = {}
+        for records, sync_token in fetch_changes(self.library, self.sync_token):
+            for record in records:
+                record_name = record["recordName"]
+                if record.get("deleted"):
+                    # Tombstones of assets name no photo and are never recorded
+                    self.deleted.add(record_name)
+                    masters.pop(record_name, None)
+                    assets.pop(record_name, None)
+                elif record["recordType"] == "CPLMaster":
+                    if record_name in assets:
+                        yield PhotoAsset(
+                            self.library.service, record, assets.pop(record_name)
+                        )
+                    else:
+                        masters[record_name] = record
+                elif record["recordType"] == "CPLAsset":
+                    fields = record["fields"]
+                    master_id = fields["masterRef"]["value"]["recordName"]
+                    if any(fields.get(flag, {}).get("value") for flag in REMOVED_FLAGS):
+                        # Moved to Recently Deleted or hidden from All Photos
+                        self.deleted.add(master_id)
+                        masters.pop(master_id, None)
+                        assets.pop(master_id, None)
+                    elif master_id in masters:
+                        self.deleted.discard(master_id)
+                        yield PhotoAsset(
+                            self.library.service, masters.pop(master_id), record
+                        )
+                    else:
+                        self.deleted.discard(master_id)
+                        assets[master_id] = record
+            self.sync_token = sync_token
+            self.requests += 1
+        # Other unpaired records only change metadata which is not synced
+        if self.manifest is not None:
+            missing = [
+                master_id
+                for master_id in assets
+                if not self.manifest.get_photo_paths(photo_ids=[master_id])
+            ]
+            for start in range(0, len(missing), LOOKUP_BATCH_SIZE):
+                end = start + LOOKUP_BATCH_SIZE
+                for master in lookup_records(self.library, missing[start:end]):
+                    yield PhotoAsset(
+                        self.library.service, master, assets[master["recordName"]]
+                    )
+                self.requests += 1
@@ -2,6 +2,7 @@
 __author__ = "Mandar Patil <mandarons@pm.me>"
 import datetime
 import os
+import threading
 from time import sleep
 
 from icloudpy import ICloudPyService, exceptions, utils
@@ -18,17 +19,37 @@ from src import (
     sync_drive,
     sync_photos,
 )
+from src.sync_plan import SyncPlan
 from src.usage import alive
 
 
+def serialize_requests(session):
+    """Let one thread at a time make a request on the shared session.
+
+    Every request rewrites the session file and saves the cookie jar, neither
+    of which is thread safe. Streamed downloads hold the lock only until their
+    headers are in, their content is read outside of it.
+    """
+    # Re-authentication retries the request from within it
+    lock = threading.RLock()
+    request = session.request
+
+    def locked_request(method, url, **kwargs):
+        with lock:
+            return request(method, url, **kwargs)
+
+    session.request = locked_request
+    return session
+
+
 def get_api_instance(
     username,
     password,
     cookie_directory=DEFAULT_COOKIE_DIRECTORY,
     server_region="global",
 ):
-    """Get API client instance."""
-    return (
+    """Get API client instance, safe to share between sync workers."""
+    api = (
         ICloudPyService(
             apple_id=username,
             password=password,
@@ -43,10 +64,12 @@ def get_api_instance(
             cookie_directory=cookie_directory,
         )
     )
+    serialize_requests(api.session)
+    return api
 
 
-def sync():
-    """Sync data from server."""
+def sync(dry_run=False):
+    """Sync data from server, or only plan a single sync on a dry run."""
     last_send = None
     enable_sync_drive = True
     enable_sync_photos = True
@@ -60,6 +83,7 @@ def sync():
             )
         )
         alive(config=config)
+        dry_run = dry_run or config_parser.get_dry_run(config=config)
         username = config_parser.get_username(config=config)
         if username:
             try:
@@ -76,16 +100,34 @@ def sync():
                 )
                 if not api.requires_2sa:
                     if "drive" in config and enable_sync_drive:
-                        LOGGER.info("Syncing drive...")
-                        sync_drive.sync_drive(config=config, drive=api.drive)
-                        LOGGER.info("Drive synced")
+                        if dry_run:
+                            LOGGER.info("Planning drive sync...")
+                            plan = SyncPlan()
+                            sync_drive.sync_drive(
+                                config=config, drive=api.drive, plan=plan
+                            )
+                            plan.log_summary(name="drive")
+                        elif sync_drive.drive_changed(config=config, drive=api.drive):
+                            LOGGER.info("Syncing drive...")
+                            sync_drive.sync_drive(config=config, drive=api.drive)
+                            LOGGER.info("Drive synced")
+                        else:
+                            LOGGER.info("No changes detected in drive.")
                         drive_sync_interval = config_parser.get_drive_sync_interval(
                             config=config
                         )
                     if "photos" in config and enable_sync_photos:
-                        LOGGER.info("Syncing photos...")
-                        sync_photos.sync_photos(config=config, photos=api.photos)
-                        LOGGER.info("Photos synced")
+                        if dry_run:
+                            LOGGER.info("Planning photos sync...")
+                            plan = SyncPlan()
+                            sync_photos.sync_photos(
+                                config=config, photos=api.photos, plan=plan
+                            )
+                            plan.log_summary(name="photos")
+                        else:
+                            LOGGER.info("Syncing photos...")
+                            sync_photos.sync_photos(config=config, photos=api.photos)
+                            LOGGER.info("Photos synced")
                         photos_sync_interval = config_parser.get_photos_sync_interval(
                             config=config
                         )
@@ -117,6 +159,9 @@ def sync():
                 sleep(sleep_for)
                 continue
 
+        if dry_run:
+            # A plan is made once, there is nothing to resync
+            break
         if "drive" not in config and "photos" in config:
             sleep_for = photos_sync_interval
             enable_sync_drive = False
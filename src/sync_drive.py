@@ -1,99 +1,235 @@
 """Sync drive module."""
 __author__ = "Mandar Patil (mandarons@pm.me)"
 
-import gzip
+import json
 import os
 import re
+import stat
+import tempfile
+import threading
 import time
 import unicodedata
 import zipfile
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
-from shutil import copyfileobj, rmtree
+from shutil import rmtree
 
 import magic
 from icloudpy import exceptions
 from pathspec import PathSpec
 
-from src import LOGGER, config_parser
+from src import (
+    DEFAULT_LISTING_BATCH_SIZE,
+    DEFAULT_MAX_CONCURRENT_DOWNLOADS,
+    DEFAULT_MAX_CONCURRENT_EXTRACTIONS,
+    DEFAULT_MAX_CONCURRENT_LISTINGS,
+    LOGGER,
+    config_parser,
+)
+from src.kept_paths import KeptPaths
+from src.manifest import Manifest, init_manifest
 
+DRIVE_FILTERS_META_KEY = "drive_filters"
+DRIVE_STATE_META_KEY = "drive_state"
+PART_FILE_SUFFIX = ".part"
+# Etag of the remote file a partial download was started from
+PART_ETAG_SUFFIX = ".part.etag"
+# Fetching the download URL and then the content
+DOWNLOAD_REQUESTS = 2
+MAX_PENDING_DOWNLOADS = 100
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+PACKAGE_SPOOL_MAX_SIZE = 64 * 1024 * 1024
+PARALLEL_EXTRACTION_MIN_SIZE = 32 * 1024 * 1024
+SNIFF_SIZE = 2048
+CONTENT_TYPE_MAGICS = (
+    (b"\x1f\x8b", "application/gzip"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"PK\x05\x06", "application/zip"),
+)
+GZIP_CONTENT_TYPES = frozenset(["application/gzip", "application/x-gzip"])
+ZIP_CONTENT_TYPES = frozenset(["application/zip", "application/x-zip-compressed"])
+MAGIC_LOCK = threading.Lock()
+PACKAGE_EXTENSIONS = frozenset(
+    [
+        "app",
+        "band",
+        "bundle",
+        "fcpbundle",
+        "framework",
+        "imovielibrary",
+        "logicx",
+        "photoslibrary",
+        "playground",
+        "rtfd",
+        "scptd",
+        "sparsebundle",
+        "xcodeproj",
+        "xcworkspace",
+    ]
+)
 
-def wanted_file(filters, ignore, file_path):
-    """Check if file is wanted."""
-    if not file_path:
-        return False
-    if ignore:
-        if PathSpec.from_lines("gitwildmatch", ignore).match_file(file_path):
+
+class DriveFilter:
+    """Drive filters and ignore patterns, compiled once per sync."""
+
+    def __init__(self, filters=None, ignore=None, root=None):
+        """Compile the given filters."""
+        filters = filters if filters else {}
+        self.ignore_spec = (
+            PathSpec.from_lines("gitwildmatch", ignore) if ignore else None
+        )
+        file_extensions = filters.get("file_extensions")
+        # One alternation instead of a regex search per extension
+        self.file_extensions_pattern = (
+            re.compile(
+                "|".join(f"(?:{extension})$" for extension in file_extensions),
+                re.IGNORECASE,
+            )
+            if file_extensions
+            else None
+        )
+        folders = filters.get("folders")
+        self.root = os.path.abspath(root) if root else None
+        # Trie of the filter folder components below root, "" marks a filter folder
+        self.folder_trie = None
+        if folders and root:
+            self.folder_trie = {}
+            for folder in folders:
+                node = self.folder_trie
+                for part in unicodedata.normalize("NFC", str(folder)).split("/"):
+                    if part not in ("", "."):
+                        node = node.setdefault(part, {})
+                node[""] = {}
+
+    def wanted_file(self, file_path):
+        """Check if file is wanted."""
+        if not file_path:
+            return False
+        if (self.ignore_spec and self.ignore_spec.match_file(file_path)) or (
+            self.file_extensions_pattern
+            and not self.file_extensions_pattern.search(file_path)
+        ):
             LOGGER.debug(f"Skipping the unwanted file {file_path}")
             return False
-    if not filters or len(filters) == 0:
         return True
-    for file_extension in filters:
-        if re.search(f"{file_extension}$", file_path, re.IGNORECASE):
+
+    def match_folder(self, folder_path):
+        """Return if folder leads to a filter folder and if it is inside one."""
+        folder_path = os.path.normpath(folder_path)
+        root_prefix = os.path.join(self.root, "")
+        prefix_length = len(root_prefix)
+        if folder_path == self.root:
+            parts = []
+        elif folder_path.startswith(root_prefix):
+            parts = folder_path[prefix_length:].split(os.sep)
+        else:
+            return False, False
+        node = self.folder_trie
+        for part in parts:
+            if "" in node:
+                return True, True
+            node = node.get(part)
+            if node is None:
+                return False, False
+        return True, "" in node
+
+    def wanted_folder(self, folder_path):
+        """Check if folder is wanted."""
+        if self.ignore_spec and self.ignore_spec.match_file(f"{folder_path}/"):
+            return False
+        if self.folder_trie is None or not folder_path:
+            # Nothing to filter, return True
             return True
-    LOGGER.debug(f"Skipping the unwanted file {file_path}")
-    return False
+        return self.match_folder(folder_path=folder_path)[0]
+
+    def wanted_parent_folder(self, folder_path):
+        """Check if parent folder is wanted."""
+        if self.folder_trie is None or not folder_path:
+            return True
+        return self.match_folder(folder_path=folder_path)[1]
+
+
+def wanted_file(filters, ignore, file_path):
+    """Check if file is wanted."""
+    return DriveFilter(filters={"file_extensions": filters}, ignore=ignore).wanted_file(
+        file_path=file_path
+    )
 
 
 def wanted_folder(filters, ignore, root, folder_path):
     """Check if folder is wanted."""
-    if ignore:
-        if PathSpec.from_lines("gitwildmatch", ignore).match_file(f"{folder_path}/"):
-            return False
-    if not filters or not folder_path or not root or len(filters) == 0:
-        # Nothing to filter, return True
-        return True
-        # Something to filter
-    folder_path = Path(folder_path)
-    for folder in filters:
-        child_path = Path(
-            os.path.join(
-                os.path.abspath(root), str(folder).removeprefix("/").removesuffix("/")
-            )
-        )
-        if (
-            folder_path in child_path.parents
-            or child_path in folder_path.parents
-            or folder_path == child_path
-        ):
-            return True
-    return False
+    return DriveFilter(
+        filters={"folders": filters}, ignore=ignore, root=root
+    ).wanted_folder(folder_path=folder_path)
 
 
 def wanted_parent_folder(filters, root, folder_path):
     """Check if parent folder is wanted."""
-    if not filters or not folder_path or not root or len(filters) == 0:
-        return True
-    folder_path = Path(folder_path)
-    for folder in filters:
-        child_path = Path(
-            os.path.join(
-                os.path.abspath(root), folder.removeprefix("/").removesuffix("/")
-            )
-        )
-        if child_path in folder_path.parents or folder_path == child_path:
-            return True
-    return False
+    return DriveFilter(filters={"folders": filters}, root=root).wanted_parent_folder(
+        folder_path=folder_path
+    )
+
+
+def scan_folder(folder_path):
+    """Return the entries of the local folder by name, listed with one scandir."""
+    try:
+        with os.scandir(folder_path) as entries:
+            return {entry.name: entry for entry in entries}
+    except OSError:
+        return {}
 
 
-def process_folder(item, destination_path, filters, ignore, root):
+def stat_local_path(local_path, snapshot=None):
+    """Return the stat of the local path or None, from its folder snapshot if given."""
+    try:
+        if snapshot is None:
+            return os.stat(local_path)
+        entry = snapshot.get(os.path.basename(local_path))
+        # Entries cache their stat, only the first call reaches the disk
+        return entry.stat() if entry is not None else None
+    except OSError:
+        return None
+
+
+def process_folder(
+    item,
+    destination_path,
+    filters,
+    ignore,
+    root,
+    drive_filter=None,
+    plan=None,
+    exists=False,
+):
     """Process the given folder."""
     if not (item and destination_path and root):
         return None
+    if drive_filter is None:
+        drive_filter = DriveFilter(
+            filters={"folders": filters}, ignore=ignore, root=root
+        )
     new_directory = os.path.join(destination_path, item.name)
     new_directory_norm = unicodedata.normalize("NFC", new_directory)
-    if not wanted_folder(
-        filters=filters, ignore=ignore, folder_path=new_directory_norm, root=root
-    ):
+    if not drive_filter.wanted_folder(folder_path=new_directory_norm):
         LOGGER.debug(f"Skipping the unwanted folder {new_directory} ...")
         return None
-    os.makedirs(new_directory_norm, exist_ok=True)
+    if plan is None and not exists:
+        os.makedirs(new_directory_norm, exist_ok=True)
     return new_directory
 
 
-def package_exists(item, local_package_path):
+def package_exists(item, local_package_path, remove_changed=True, snapshot=None):
     """Check for package existence."""
-    if item and local_package_path and os.path.isdir(local_package_path):
-        local_package_modified_time = int(os.path.getmtime(local_package_path))
+    local_package_stat = (
+        stat_local_path(local_package_path, snapshot)
+        if item and local_package_path
+        else None
+    )
+    if local_package_stat is not None and stat.S_ISDIR(local_package_stat.st_mode):
+        local_package_modified_time = int(local_package_stat.st_mtime)
         remote_package_modified_time = int(item.date_modified.timestamp())
         local_package_size = sum(
             f.stat().st_size
@@ -115,18 +251,22 @@ def package_exists(item, local_package_path):
                 + f"remote_modified_time is {remote_package_modified_time}, "
                 + f"local_package_size is {local_package_size} and remote_package_size is {remote_package_size}."
             )
-            rmtree(local_package_path)
+            if remove_changed:
+                rmtree(local_package_path)
     else:
         LOGGER.debug(f"Package {local_package_path} does not exist locally.")
     return False
 
 
-def file_exists(item, local_file):
+def file_exists(item, local_file, snapshot=None):
     """Check for file existence locally."""
-    if item and local_file and os.path.isfile(local_file):
-        local_file_modified_time = int(os.path.getmtime(local_file))
+    local_file_stat = (
+        stat_local_path(local_file, snapshot) if item and local_file else None
+    )
+    if local_file_stat is not None and stat.S_ISREG(local_file_stat.st_mode):
+        local_file_modified_time = int(local_file_stat.st_mtime)
         remote_file_modified_time = int(item.date_modified.timestamp())
-        local_file_size = os.path.getsize(local_file)
+        local_file_size = local_file_stat.st_size
         remote_file_size = item.size
         if local_file_modified_time == remote_file_modified_time and (
             local_file_size == remote_file_size
@@ -146,58 +286,225 @@ def file_exists(item, local_file):
     return False
 
 
-def process_package(local_file):
-    """Process the package."""
-    archive_file = local_file
-    magic_object = magic.Magic(mime=True)
-    if "application/zip" == magic_object.from_file(filename=local_file):
-        archive_file += ".zip"
-        os.rename(local_file, archive_file)
-        LOGGER.info(f"Unpacking {archive_file} to {os.path.dirname(archive_file)}")
-        zipfile.ZipFile(archive_file).extractall(path=os.path.dirname(archive_file))
-        normalized_path = unicodedata.normalize("NFD", local_file)
-        if normalized_path is not local_file:
-            os.rename(local_file, normalized_path)
-            local_file = normalized_path
-        os.remove(archive_file)
-    elif "application/gzip" == magic_object.from_file(filename=local_file):
-        archive_file += ".gz"
-        os.rename(local_file, archive_file)
-        LOGGER.info(f"Unpacking {archive_file} to {os.path.dirname(local_file)}")
-        with gzip.GzipFile(filename=archive_file, mode="rb") as gz_file:
-            with open(file=local_file, mode="wb") as package_file:
-                copyfileobj(gz_file, package_file)
-        os.remove(archive_file)
-        process_package(local_file=local_file)
-    else:
-        LOGGER.error(
-            f"Unhandled file type - cannot unpack the package {magic_object.from_file(filename=archive_file)}."
+@lru_cache(maxsize=None)
+def get_magic():
+    """Return the libmagic handle shared by all the downloads."""
+    return magic.Magic(mime=True)
+
+
+def sniff_content_type(head):
+    """Return the MIME type of the content starting with head."""
+    for magic_bytes, content_type in CONTENT_TYPE_MAGICS:
+        if head.startswith(magic_bytes):
+            return content_type
+    # libmagic handles are not thread-safe
+    with MAGIC_LOCK:
+        return get_magic().from_buffer(head)
+
+
+def gunzip_chunks(chunks):
+    """Decompress the gzip chunks on the fly."""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    yield decompressor.flush()
+
+
+def extract_zip(archive, destination_path, extraction_executor=None):
+    """Extract the zip archive, in parallel per member for large archives."""
+    with zipfile.ZipFile(archive) as zip_file:
+        members = [member for member in zip_file.infolist() if not member.is_dir()]
+        if (
+            extraction_executor is None
+            or len(members) < 2
+            or sum(member.file_size for member in members)
+            < PARALLEL_EXTRACTION_MIN_SIZE
+        ):
+            zip_file.extractall(path=destination_path)
+            return
+        # Create the folders upfront, concurrent members would race creating them
+        for member in zip_file.infolist():
+            if member.is_dir():
+                zip_file.extract(member=member, path=destination_path)
+            else:
+                parent = os.path.normpath(
+                    os.path.join(destination_path, os.path.dirname(member.filename))
+                )
+                if parent.startswith(os.path.join(destination_path, "")):
+                    os.makedirs(parent, exist_ok=True)
+        # zlib releases the GIL, so members are decompressed in parallel
+        for future in [
+            extraction_executor.submit(
+                zip_file.extract, member=member, path=destination_path
+            )
+            for member in members
+        ]:
+            future.result()
+
+
+def unpack_package(chunks, local_file, extraction_executor=None):
+    """Unpack the package archive streamed in chunks."""
+    chunks = iter(chunks)
+    head = b""
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= SNIFF_SIZE:
+            break
+    chunks = chain([head], chunks)
+    content_type = sniff_content_type(head=head[:SNIFF_SIZE])
+    if content_type in GZIP_CONTENT_TYPES:
+        LOGGER.info(f"Decompressing {local_file} ...")
+        return unpack_package(
+            chunks=gunzip_chunks(chunks),
+            local_file=local_file,
+            extraction_executor=extraction_executor,
         )
+    if content_type not in ZIP_CONTENT_TYPES:
+        LOGGER.error(f"Unhandled file type - cannot unpack the package {content_type}.")
         return False
-    LOGGER.info(f"Successfully unpacked the package {archive_file}.")
+    destination_path = os.path.dirname(local_file)
+    # Small archives never touch the disk before extraction
+    with tempfile.SpooledTemporaryFile(
+        max_size=PACKAGE_SPOOL_MAX_SIZE, dir=destination_path
+    ) as archive:
+        for chunk in chunks:
+            archive.write(chunk)
+        archive.seek(0)
+        if os.path.isfile(local_file):
+            os.remove(local_file)
+        LOGGER.info(f"Unpacking {local_file} to {destination_path}")
+        extract_zip(
+            archive=archive,
+            destination_path=destination_path,
+            extraction_executor=extraction_executor,
+        )
+    normalized_path = unicodedata.normalize("NFD", local_file)
+    if normalized_path != local_file:
+        os.rename(local_file, normalized_path)
+        local_file = normalized_path
+    LOGGER.info(f"Successfully unpacked the package {local_file}.")
     return local_file
 
 
-def is_package(item):
-    """Determine if item is a package."""
-    file_is_a_package = False
-    with item.open(stream=True) as response:
-        file_is_a_package = response.url and "/packageDownload?" in response.url
-    return file_is_a_package
+def is_package(item, local_file=None, entry=None, snapshot=None):
+    """Determine if item is a package from its metadata."""
+    if entry is not None:
+        return bool(entry["is_package"])
+    if str(item.data.get("extension", "")).lower() in PACKAGE_EXTENSIONS:
+        return True
+    # Unknown items are classified by the download which reveals the package
+    local_stat = stat_local_path(local_file, snapshot) if local_file else None
+    return local_stat is not None and stat.S_ISDIR(local_stat.st_mode)
+
+
+def modified_time(item):
+    """Return remote modified time of the item in seconds."""
+    return int(item.date_modified.timestamp()) if item.date_modified else None
+
+
+def manifest_unchanged(item, entry, local_file, snapshot=None):
+    """Check if item is unchanged since it was recorded in the manifest."""
+    if not (
+        entry
+        and entry["local_path"] == local_file
+        and entry["etag"] == item.data.get("etag")
+    ):
+        return False
+    local_stat = stat_local_path(local_file, snapshot)
+    if local_stat is None:
+        return False
+    return int(local_stat.st_mtime) == entry["modified"] and (
+        entry["is_package"] or local_stat.st_size == (entry["size"] or 0)
+    )
+
+
+def record_file(item, local_file, item_is_package, manifest):
+    """Record the synced file in the manifest."""
+    if manifest is not None:
+        manifest.put_drive_item(
+            drivewsid=item.data.get("drivewsid"),
+            type="file",
+            etag=item.data.get("etag"),
+            size=item.size,
+            modified=modified_time(item),
+            local_path=local_file,
+            is_package=int(item_is_package),
+        )
+
+
+def package_members(local_file, manifest=None, refresh=False):
+    """Return the local paths inside the package, as recorded at extraction."""
+    members = (
+        manifest.get_package_members(package_path=local_file)
+        if manifest is not None and not refresh
+        else None
+    )
+    if members is None:
+        members = [str(f) for f in Path(local_file).glob("**/*")]
+        if manifest is not None:
+            manifest.put_package_members(package_path=local_file, members=members)
+    return members
 
 
-def download_file(item, local_file):
+def part_etag(local_file):
+    """Return the etag the partial download of the file was started from."""
+    try:
+        with open(local_file + PART_ETAG_SUFFIX, encoding="utf-8") as file_in:
+            return file_in.read()
+    except FileNotFoundError:
+        return None
+
+
+def download_file(item, local_file, extraction_executor=None):
     """Download file from server."""
     if not (item and local_file):
         return False
     LOGGER.info(f"Downloading {local_file} ...")
+    part_file = local_file + PART_FILE_SUFFIX
+    etag_file = local_file + PART_ETAG_SUFFIX
+    etag = item.data.get("etag")
     try:
-        with item.open(stream=True) as response:
-            with open(local_file, "wb") as file_out:
-                for chunk in response.iter_content(4 * 1024 * 1024):
-                    file_out.write(chunk)
+        offset = os.path.getsize(part_file) if os.path.isfile(part_file) else 0
+        if (item.size is not None and offset >= item.size) or (
+            offset and (etag is None or part_etag(local_file) != etag)
+        ):
+            # The partial download is of another version of the file
+            offset = 0
+        with item.open(
+            stream=True, headers={"Range": f"bytes={offset}-"} if offset else {}
+        ) as response:
+            chunks = response.iter_content(DOWNLOAD_CHUNK_SIZE)
             if response.url and "/packageDownload?" in response.url:
-                local_file = process_package(local_file=local_file)
+                # Packages are unpacked while they stream in
+                local_file = unpack_package(
+                    chunks=chunks,
+                    local_file=local_file,
+                    extraction_executor=extraction_executor,
+                )
+                if not local_file:
+                    return False
+            else:
+                if offset and response.status_code != 206:
+                    LOGGER.debug(f"Range not honored, restarting {local_file} ...")
+                    offset = 0
+                elif offset:
+                    LOGGER.info(f"Resuming {local_file} from byte {offset} ...")
+                if not offset and etag is not None:
+                    with open(etag_file, "w", encoding="utf-8") as file_out:
+                        file_out.write(etag)
+                with open(part_file, "ab" if offset else "wb") as file_out:
+                    for chunk in chunks:
+                        file_out.write(chunk)
+                if offset and os.path.getsize(part_file) != item.size:
+                    # The remote file changed since the partial download
+                    os.remove(part_file)
+                    os.remove(etag_file)
+                    raise ValueError("size mismatch after resuming the download")
+                os.replace(part_file, local_file)
+                if os.path.isfile(etag_file):
+                    os.remove(etag_file)
         item_modified_time = time.mktime(item.date_modified.timetuple())
         os.utime(local_file, (item_modified_time, item_modified_time))
     except (exceptions.ICloudPyAPIResponseException, FileNotFoundError, Exception) as e:
@@ -206,45 +513,445 @@ def download_file(item, local_file):
     return local_file
 
 
-def process_file(item, destination_path, filters, ignore, files):
-    """Process given item as file."""
+def process_file(
+    item,
+    destination_path,
+    filters,
+    ignore,
+    files,
+    manifest=None,
+    drive_filter=None,
+    extraction_executor=None,
+    plan=None,
+    snapshot=None,
+):
+    """Process given item as file.
+
+    The snapshot, taken by scan_folder, answers the local checks without
+    a stat per file.
+    """
     if not (item and destination_path and files is not None):
         return False
+    if drive_filter is None:
+        drive_filter = DriveFilter(filters={"file_extensions": filters}, ignore=ignore)
     local_file = os.path.join(destination_path, item.name)
     local_file = unicodedata.normalize("NFC", local_file)
-    if not wanted_file(filters=filters, ignore=ignore, file_path=local_file):
+    if not drive_filter.wanted_file(file_path=local_file):
         return False
     files.add(local_file)
-    item_is_package = is_package(item=item)
+    entry = (
+        manifest.get_drive_item(item.data.get("drivewsid"))
+        if manifest is not None
+        else None
+    )
+    item_is_package = is_package(
+        item=item, local_file=local_file, entry=entry, snapshot=snapshot
+    )
+    if manifest_unchanged(
+        item=item, entry=entry, local_file=local_file, snapshot=snapshot
+    ):
+        LOGGER.debug(f"No changes detected. Skipping the file {local_file} ...")
+        if item_is_package:
+            files.update(package_members(local_file=local_file, manifest=manifest))
+        if plan is not None:
+            plan.skip(local_file)
+        return False
     if item_is_package:
-        if package_exists(item=item, local_package_path=local_file):
-            for f in Path(local_file).glob("**/*"):
-                files.add(str(f))
+        if package_exists(
+            item=item,
+            local_package_path=local_file,
+            remove_changed=plan is None,
+            snapshot=snapshot,
+        ):
+            files.update(
+                package_members(local_file=local_file, manifest=manifest, refresh=True)
+            )
+            record_file(item, local_file, True, manifest)
+            if plan is not None:
+                plan.skip(local_file)
             return False
-    elif file_exists(item=item, local_file=local_file):
+    elif file_exists(item=item, local_file=local_file, snapshot=snapshot):
+        record_file(item, local_file, False, manifest)
+        if plan is not None:
+            plan.skip(local_file)
         return False
-    local_file = download_file(item=item, local_file=local_file)
+    if plan is not None:
+        plan.download(local_file, item.size, requests=DOWNLOAD_REQUESTS)
+        return True
+    downloaded_file = download_file(
+        item=item, local_file=local_file, extraction_executor=extraction_executor
+    )
+    if downloaded_file:
+        if os.path.isdir(downloaded_file):
+            # Members are listed once, right after the extraction
+            files.update(
+                package_members(local_file=local_file, manifest=manifest, refresh=True)
+            )
+        record_file(item, local_file, os.path.isdir(downloaded_file), manifest)
+    elif os.path.isfile(local_file + PART_FILE_SUFFIX):
+        # Keep the partial download to resume it on the next sync
+        files.update((local_file + PART_FILE_SUFFIX, local_file + PART_ETAG_SUFFIX))
     return True
 
 
+def find_obsolete(destination_path, files):
+    """Return the local files and folders missing from files."""
+    obsolete_files = []
+    obsolete_folders = []
+    # A dry run leaves a new destination uncreated
+    folders = (
+        [os.path.abspath(destination_path)] if os.path.isdir(destination_path) else []
+    )
+    while folders:
+        with os.scandir(folders.pop()) as entries:
+            for entry in entries:
+                is_folder = entry.is_dir(follow_symlinks=False)
+                if entry.path in files:
+                    if is_folder:
+                        folders.append(entry.path)
+                elif is_folder:
+                    # The whole subtree goes, there is no need to walk it
+                    obsolete_folders.append(entry.path)
+                else:
+                    obsolete_files.append(entry.path)
+    return obsolete_files, obsolete_folders
+
+
 def remove_obsolete(destination_path, files):
     """Remove local obsolete file."""
     removed_paths = set()
     if not (destination_path and files is not None):
         return removed_paths
-    for path in Path(destination_path).rglob("*"):
-        local_file = str(path.absolute())
-        if local_file not in files:
-            LOGGER.info(f"Removing {local_file} ...")
-            if path.is_file():
-                path.unlink(missing_ok=True)
-                removed_paths.add(local_file)
-            elif path.is_dir():
-                rmtree(local_file)
-                removed_paths.add(local_file)
+    start = time.monotonic()
+    obsolete_files, obsolete_folders = find_obsolete(destination_path, files)
+    for local_file in obsolete_files:
+        LOGGER.info(f"Removing {local_file} ...")
+        try:
+            os.unlink(local_file)
+        except FileNotFoundError:
+            pass
+        removed_paths.add(local_file)
+    for local_folder in obsolete_folders:
+        LOGGER.info(f"Removing {local_folder} ...")
+        rmtree(local_folder)
+        removed_paths.add(local_folder)
+    LOGGER.info(
+        f"Removed {len(removed_paths)} obsolete paths in {time.monotonic() - start:.2f} seconds."
+    )
     return removed_paths
 
 
+def file_synced(item, manifest):
+    """Check if the manifest holds the current version of the item."""
+    entry = manifest.get_drive_item(item.data.get("drivewsid"))
+    return bool(entry) and entry["etag"] == item.data.get("etag")
+
+
+def download_worker(
+    item,
+    destination_path,
+    filters,
+    ignore,
+    files,
+    manifest=None,
+    drive_filter=None,
+    extraction_executor=None,
+    plan=None,
+    snapshot=None,
+):
+    """Process the given file item on a download worker thread."""
+    synced = False
+    try:
+        process_file(
+            item=item,
+            destination_path=destination_path,
+            filters=filters,
+            ignore=ignore,
+            files=files,
+            manifest=manifest,
+            drive_filter=drive_filter,
+            extraction_executor=extraction_executor,
+            plan=plan,
+            snapshot=snapshot,
+        )
+        local_file = unicodedata.normalize(
+            "NFC", os.path.join(destination_path, item.name)
+        )
+        # Unwanted files are never added and have nothing to sync
+        synced = (
+            manifest is None or local_file not in files or file_synced(item, manifest)
+        )
+    except Exception as e:
+        # Continue with the remaining items, without crashing the app
+        LOGGER.error(f"Failed to process {item.name}: {str(e)}")
+    return synced
+
+
+def folder_unchanged(item, local_folder, manifest):
+    """Check if the folder is unchanged since its subtree was last synced."""
+    entry = manifest.get_drive_item(item.data.get("drivewsid"))
+    return (
+        bool(entry)
+        and entry["type"] == "folder"
+        and entry["local_path"] == local_folder
+        and entry["etag"] == item.data.get("etag")
+    )
+
+
+def move_recorded_item(item, local_path, root, manifest):
+    """Move the local copy of an item moved or renamed in iCloud Drive."""
+    entry = manifest.get_drive_item(item.data.get("drivewsid"))
+    if not entry or entry["local_path"] == local_path:
+        return False
+    previous_path = entry["local_path"]
+    if (
+        not previous_path.startswith(os.path.join(os.path.abspath(root), ""))
+        or not os.path.lexists(previous_path)
+        or os.path.lexists(local_path)
+    ):
+        return False
+    LOGGER.info(f"Moving {previous_path} to {local_path} ...")
+    try:
+        os.rename(previous_path, local_path)
+    except OSError as e:
+        LOGGER.warning(f"Failed to move {previous_path} to {local_path}: {str(e)}")
+        return False
+    manifest.move_drive_items(previous_path=previous_path, local_path=local_path)
+    return True
+
+
+def move_recorded_items(level, root, manifest, drive_filter):
+    """Move the local copies of the items of a level moved in iCloud Drive."""
+    for node, path, names in level:
+        for i in names:
+            item = node[i]
+            local_path = unicodedata.normalize("NFC", os.path.join(path, item.name))
+            if item.type in ("folder", "app_library"):
+                wanted = drive_filter.wanted_folder(folder_path=local_path)
+            else:
+                wanted = (
+                    item.type == "file"
+                    and drive_filter.wanted_parent_folder(folder_path=path)
+                    and drive_filter.wanted_file(file_path=local_path)
+                )
+            if wanted:
+                move_recorded_item(item, local_path, root, manifest)
+
+
+def recorded_files(local_folder, manifest, files, plan=None):
+    """Add the recorded local paths below an unchanged folder to files."""
+    for entry in manifest.get_drive_items_under(local_folder):
+        files.add(entry["local_path"])
+        if plan is not None and entry["type"] == "file":
+            plan.skip(entry["local_path"])
+        if entry["is_package"]:
+            files.update(
+                package_members(local_file=entry["local_path"], manifest=manifest)
+            )
+    return files
+
+
+def record_folders(folders, failed, manifest):
+    """Record etags of the folders whose subtree synced without failures."""
+    dirty = set()
+    for path in failed:
+        while path not in dirty:
+            dirty.add(path)
+            path = os.path.dirname(path)
+    recorded = 0
+    for item, local_folder in folders:
+        if local_folder not in dirty:
+            manifest.put_drive_item(
+                drivewsid=item.data.get("drivewsid"),
+                type="folder",
+                etag=item.data.get("etag"),
+                local_path=local_folder,
+                is_package=0,
+            )
+            recorded += 1
+    return recorded
+
+
+def retrieve_folders(folders):
+    """Retrieve details of the given folders with a single request."""
+    connection = folders[0].connection
+    response = connection.session.post(
+        connection._service_root  # pylint: disable=protected-access
+        + "/retrieveItemDetailsInFolders",
+        params=connection.params,
+        data=json.dumps(
+            [
+                {"drivewsid": folder.data["drivewsid"], "partialData": False}
+                for folder in folders
+            ]
+        ),
+    )
+    if not response.ok:
+        connection.session.raise_error(response.status_code, response.reason)
+    details = {
+        folder_data.get("drivewsid"): folder_data for folder_data in response.json()
+    }
+    retrieved = 0
+    for folder in folders:
+        folder_data = details.get(folder.data["drivewsid"])
+        if folder_data and "items" in folder_data:
+            folder.data.update(folder_data)
+            retrieved += 1
+    return retrieved
+
+
+def list_folders(
+    folders,
+    listing_executor,
+    batch_size=DEFAULT_LISTING_BATCH_SIZE,
+    failed=None,
+    plan=None,
+):
+    """List the given folders concurrently."""
+    pending = [item for item, _ in folders if "items" not in item.data]
+    batches = []
+    for start in range(0, len(pending), batch_size):
+        end = start + batch_size
+        batches.append(
+            listing_executor.submit(retrieve_folders, folders=pending[start:end])
+        )
+    for batch in batches:
+        try:
+            batch.result()
+        except Exception as e:
+            # Folders missing from the batch are retrieved one by one below
+            LOGGER.warning(f"Failed to retrieve folders in batch: {str(e)}")
+    if plan is not None:
+        # Folders still without items are listed with a request each
+        plan.request(
+            len(batches) + sum(1 for item, _ in folders if "items" not in item.data)
+        )
+    listings = [
+        (item, new_folder, listing_executor.submit(item.dir))
+        for item, new_folder in folders
+    ]
+    next_level = []
+    for item, new_folder, listing in listings:
+        try:
+            next_level.append((item, new_folder, listing.result()))
+        except Exception as e:
+            # Continue execution to next folder, without crashing the app
+            LOGGER.error(f"Failed to list {new_folder}: {str(e)}")
+            if failed is not None:
+                failed.add(unicodedata.normalize("NFC", new_folder))
+    return next_level
+
+
+def finish_downloads(futures, failed=None, pending=0):
+    """Wait for the queued downloads until at most pending are left.
+
+    The folders of failed downloads are added to failed.
+    """
+    while len(futures) > pending:
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            path = futures.pop(future)
+            if not future.result() and failed is not None:
+                failed.add(unicodedata.normalize("NFC", path))
+
+
+def traverse_directory(
+    drive,
+    destination_path,
+    items,
+    root,
+    filters,
+    ignore,
+    executor,
+    futures,
+    listing_executor,
+    listing_batch_size=DEFAULT_LISTING_BATCH_SIZE,
+    manifest=None,
+    walked=None,
+    failed=None,
+    incremental=False,
+    drive_filter=None,
+    extraction_executor=None,
+    files=None,
+    plan=None,
+):
+    """Walk the folder tree breadth-first and queue its files for download."""
+    # Every path is added once to this collector, shared with download workers
+    files = KeptPaths() if files is None else files
+    if drive_filter is None:
+        drive_filter = DriveFilter(filters=filters, ignore=ignore, root=root)
+    level = [(drive, destination_path, items)]
+    while level:
+        folders = []
+        if manifest is not None and plan is None:
+            # A move may vacate a path that a new sibling takes over
+            move_recorded_items(level, root, manifest, drive_filter)
+        for node, path, names in level:
+            # One scandir answers the local checks of every item in the folder
+            snapshot = scan_folder(unicodedata.normalize("NFC", path))
+            for i in names:
+                item = node[i]
+                if item.type in ("folder", "app_library"):
+                    local_folder = unicodedata.normalize(
+                        "NFC", os.path.join(path, item.name)
+                    )
+                    entry = snapshot.get(os.path.basename(local_folder))
+                    existed = entry is not None and entry.is_dir()
+                    new_folder = process_folder(
+                        item=item,
+                        destination_path=path,
+                        filters=None,
+                        ignore=None,
+                        root=root,
+                        drive_filter=drive_filter,
+                        plan=plan,
+                        exists=existed,
+                    )
+                    if not new_folder:
+                        continue
+                    files.add(local_folder)
+                    if (
+                        incremental
+                        and existed
+                        and folder_unchanged(item, local_folder, manifest)
+                    ):
+                        LOGGER.debug(f"No changes detected in {local_folder} ...")
+                        recorded_files(local_folder, manifest, files, plan=plan)
+                        continue
+                    folders.append((item, new_folder))
+                    if walked is not None:
+                        walked.append((item, local_folder))
+                elif item.type == "file":
+                    if drive_filter.wanted_parent_folder(folder_path=path):
+                        future = executor.submit(
+                            download_worker,
+                            item=item,
+                            destination_path=path,
+                            filters=None,
+                            ignore=None,
+                            files=files,
+                            manifest=manifest,
+                            drive_filter=drive_filter,
+                            extraction_executor=extraction_executor,
+                            plan=plan,
+                            snapshot=snapshot,
+                        )
+                        futures[future] = path
+                        # Queued downloads hold their folder snapshot
+                        finish_downloads(
+                            futures, failed=failed, pending=MAX_PENDING_DOWNLOADS
+                        )
+        # Listing time scales with the tree depth rather than the folder count
+        level = list_folders(
+            folders=folders,
+            listing_executor=listing_executor,
+            batch_size=listing_batch_size,
+            failed=failed,
+            plan=plan,
+        )
+    return files
+
+
 def sync_directory(
     drive,
     destination_path,
@@ -254,80 +961,163 @@ def sync_directory(
     filters=None,
     ignore=None,
     remove=False,
+    max_concurrent_downloads=DEFAULT_MAX_CONCURRENT_DOWNLOADS,
+    max_concurrent_listings=DEFAULT_MAX_CONCURRENT_LISTINGS,
+    listing_batch_size=DEFAULT_LISTING_BATCH_SIZE,
+    manifest=None,
+    incremental=False,
+    failed=None,
+    drive_filter=None,
+    max_concurrent_extractions=DEFAULT_MAX_CONCURRENT_EXTRACTIONS,
+    plan=None,
 ):
-    """Sync folder."""
-    files = set()
+    """Sync folder, or only plan it if a plan is given."""
+    files = KeptPaths()
+    failed = set() if failed is None else failed
     if drive and destination_path and items and root:
-        for i in items:
-            item = drive[i]
-            if item.type in ("folder", "app_library"):
-                new_folder = process_folder(
-                    item=item,
-                    destination_path=destination_path,
-                    filters=filters["folders"]
-                    if filters and "folders" in filters
-                    else None,
-                    ignore=ignore,
-                    root=root,
-                )
-                if not new_folder:
-                    continue
-                try:
-                    files.add(unicodedata.normalize("NFC", new_folder))
-                    files.update(
-                        sync_directory(
-                            drive=item,
-                            destination_path=new_folder,
-                            items=item.dir(),
-                            root=root,
-                            top=False,
-                            filters=filters,
-                            ignore=ignore,
-                        )
-                    )
-                except Exception:
-                    # Continue execution to next item, without crashing the app
-                    pass
-            elif item.type == "file":
-                if wanted_parent_folder(
-                    filters=filters["folders"]
-                    if filters and "folders" in filters
-                    else None,
-                    root=root,
-                    folder_path=destination_path,
-                ):
-                    try:
-                        process_file(
-                            item=item,
-                            destination_path=destination_path,
-                            filters=filters["file_extensions"]
-                            if filters and "file_extensions" in filters
-                            else None,
-                            ignore=ignore,
-                            files=files,
-                        )
-                    except Exception:
-                        # Continue execution to next item, without crashing the app
-                        pass
-        if top and remove:
+        futures = {}
+        walked = []
+        with ThreadPoolExecutor(
+            max_workers=max_concurrent_downloads
+        ) as executor, ThreadPoolExecutor(
+            max_workers=max_concurrent_listings
+        ) as listing_executor, ThreadPoolExecutor(
+            max_workers=max_concurrent_extractions
+        ) as extraction_executor:
+            traverse_directory(
+                drive=drive,
+                destination_path=destination_path,
+                items=items,
+                root=root,
+                filters=filters,
+                ignore=ignore,
+                executor=executor,
+                futures=futures,
+                listing_executor=listing_executor,
+                listing_batch_size=listing_batch_size,
+                manifest=manifest,
+                walked=walked,
+                failed=failed,
+                incremental=incremental and manifest is not None,
+                drive_filter=drive_filter,
+                extraction_executor=extraction_executor,
+                files=files,
+                plan=plan,
+            )
+            finish_downloads(futures, failed=failed)
+        if manifest is not None:
+            record_folders(folders=walked, failed=failed, manifest=manifest)
+        if top and remove and plan is None:
             remove_obsolete(destination_path=destination_path, files=files)
+        elif top and remove:
+            obsolete_files, obsolete_folders = find_obsolete(
+                destination_path=destination_path, files=files
+            )
+            for local_path in obsolete_files + obsolete_folders:
+                plan.delete(local_path)
     return files
 
 
-def sync_drive(config, drive):
-    """Sync drive."""
-    destination_path = config_parser.prepare_drive_destination(config=config)
-    return sync_directory(
-        drive=drive,
-        destination_path=destination_path,
-        root=destination_path,
-        items=drive.dir(),
-        top=True,
-        filters=config["drive"]["filters"]
+def get_drive_filters(config):
+    """Return configured drive filters and ignore patterns."""
+    filters = (
+        config["drive"]["filters"]
         if "drive" in config and "filters" in config["drive"]
-        else None,
-        ignore=config["drive"]["ignore"]
+        else None
+    )
+    ignore = (
+        config["drive"]["ignore"]
         if "drive" in config and "ignore" in config["drive"]
-        else None,
-        remove=config_parser.get_drive_remove_obsolete(config=config),
+        else None
+    )
+    return filters, ignore
+
+
+def get_drive_state(drive, filters, ignore):
+    """Return fingerprint of the drive root metadata and sync settings."""
+    root = drive.root.data
+    return json.dumps(
+        {
+            "etag": root.get("etag"),
+            "items": sorted(
+                [item.get("drivewsid"), item.get("etag")]
+                for item in root.get("items", [])
+            ),
+            "filters": filters,
+            "ignore": ignore,
+        }
     )
+
+
+def drive_changed(config, drive):
+    """Check if the drive changed since the last successful sync."""
+    destination_path = config_parser.prepare_drive_destination(config=config)
+    with os.scandir(destination_path) as entries:
+        if next(entries, None) is None:
+            return True
+    filters, ignore = get_drive_filters(config=config)
+    manifest = Manifest(file_path=init_manifest(config=config))
+    try:
+        return manifest.get_meta(DRIVE_STATE_META_KEY) != get_drive_state(
+            drive=drive, filters=filters, ignore=ignore
+        )
+    finally:
+        manifest.close()
+
+
+def sync_drive(config, drive, plan=None):
+    """Sync drive, or only plan the sync if a plan is given."""
+    destination_path = config_parser.prepare_drive_destination(
+        config=config, create=plan is None
+    )
+    filters, ignore = get_drive_filters(config=config)
+    # Subtrees recorded with other filters cannot be reused
+    filters_fingerprint = json.dumps({"filters": filters, "ignore": ignore})
+    state = get_drive_state(drive=drive, filters=filters, ignore=ignore)
+    failed = set()
+    # Planning reads the manifest but leaves it as it was
+    manifest = Manifest(
+        file_path=init_manifest(config=config, create=plan is None),
+        read_only=plan is not None,
+    )
+    if plan is not None:
+        # Listing the drive root
+        plan.request()
+    try:
+        files = sync_directory(
+            drive=drive,
+            destination_path=destination_path,
+            root=destination_path,
+            items=drive.dir(),
+            top=True,
+            filters=filters,
+            ignore=ignore,
+            remove=config_parser.get_drive_remove_obsolete(config=config),
+            drive_filter=DriveFilter(
+                filters=filters, ignore=ignore, root=destination_path
+            ),
+            max_concurrent_downloads=config_parser.get_drive_max_concurrent_downloads(
+                config=config
+            ),
+            max_concurrent_listings=config_parser.get_drive_max_concurrent_listings(
+                config=config
+            ),
+            listing_batch_size=config_parser.get_drive_listing_batch_size(
+                config=config
+            ),
+            max_concurrent_extractions=config_parser.get_drive_max_concurrent_extractions(
+                config=config
+            ),
+            manifest=manifest,
+            incremental=manifest.get_meta(DRIVE_FILTERS_META_KEY)
+            == filters_fingerprint,
+            failed=failed,
+            plan=plan,
+        )
+        manifest.retain_drive_items(local_paths=files)
+        manifest.set_meta(DRIVE_FILTERS_META_KEY, filters_fingerprint)
+        # Only a clean sync may short-circuit the next one
+        manifest.set_meta(DRIVE_STATE_META_KEY, None if failed else state)
+        return files
+    finally:
+        manifest.close()
@@ -1,15 +1,30 @@
 """Sync photos module."""
 ___author___ = "Mandar Patil <mandarons@pm.me>"
 import base64
+import json
 import os
 import shutil
 import time
 import unicodedata
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from icloudpy import exceptions
 
 from src import LOGGER, config_parser
+from src.kept_paths import KeptPaths
+from src.manifest import Manifest, init_manifest
+from src.photo_changes import LibraryChanges
+
+# Album paging stops once this many photos wait for a download worker
+MAX_PENDING_DOWNLOADS = 100
+COPY_CHUNK_SIZE = 1 << 30
+PART_FILE_SUFFIX = ".part"
+PHOTOS_FILTERS_META_KEY = "photos_filters"
+PHOTOS_FULL_SYNC_META_KEY = "photos_full_sync"
+PHOTOS_SYNC_TOKEN_META_KEY = "photos_sync_token"
+PHOTOS_WATERMARK_META_KEY = "photos_watermark"
 
 
 def photo_wanted(photo, extensions):
@@ -22,8 +37,10 @@ def photo_wanted(photo, extensions):
     return False
 
 
-def generate_file_name(photo, file_size, destination_path, folder_format):
-    """Generate full path to file."""
+def generate_file_name(
+    photo, file_size, destination_path, folder_format, dry_run=False
+):
+    """Generate full path to file, renaming files named by older versions."""
     filename = photo.filename
     name, extension = filename.rsplit(".", 1) if "." in filename else [filename, ""]
     file_path = os.path.join(destination_path, filename)
@@ -49,9 +66,12 @@ def generate_file_name(photo, file_size, destination_path, folder_format):
             if extension == ""
             else f'{"__".join([name, file_size, base64.urlsafe_b64encode(photo.id.encode()).decode()])}.{extension}',
         )
-        os.makedirs(os.path.join(destination_path, folder), exist_ok=True)
+        if not dry_run:
+            os.makedirs(os.path.join(destination_path, folder), exist_ok=True)
 
     file_size_id_path_norm = unicodedata.normalize("NFC", file_size_id_path)
+    if dry_run:
+        return file_size_id_path_norm
 
     if os.path.isfile(file_path):
         os.rename(file_path, file_size_id_path)
@@ -77,30 +97,197 @@ def photo_exists(photo, file_size, local_path):
         return False
 
 
+def version_checksum(photo, file_size):
+    """Return the checksum of the photo version or None if it is unknown."""
+    try:
+        fields = photo._master_record["fields"]  # pylint: disable=protected-access
+        lookup = (
+            photo.VIDEO_VERSION_LOOKUP
+            if "resVidSmallRes" in fields
+            else photo.PHOTO_VERSION_LOOKUP
+        )
+        return fields[f"{lookup[file_size]}Res"]["value"].get("fileChecksum")
+    except (AttributeError, KeyError, TypeError):
+        return None
+
+
+def local_names(folder_path, snapshots):
+    """Return the names in the local folder, listed once per snapshots."""
+    if folder_path not in snapshots:
+        try:
+            with os.scandir(folder_path) as entries:
+                snapshots[folder_path] = {entry.name for entry in entries}
+        except OSError:
+            snapshots[folder_path] = set()
+    return snapshots[folder_path]
+
+
+def photo_synced(photo, file_size, photo_path, manifest):
+    """Check if the manifest holds the current version of the photo."""
+    entry = manifest.get_photo(photo.id, file_size, photo_path)
+    return (
+        bool(entry)
+        and entry["size"] == int(photo.versions[file_size]["size"])
+        and entry["checksum"] == version_checksum(photo, file_size)
+    )
+
+
+def record_photo(photo, file_size, photo_path, manifest):
+    """Record the synced photo version in the manifest."""
+    if manifest is not None:
+        manifest.put_photo(
+            photo_id=photo.id,
+            version=file_size,
+            local_path=photo_path,
+            size=int(photo.versions[file_size]["size"]),
+            checksum=version_checksum(photo, file_size),
+        )
+
+
+def synced_copy(photo, file_size, photo_path, manifest):
+    """Return another local path holding the current photo version, or None."""
+    for local_path in manifest.get_photo_copies(photo.id, file_size):
+        if (
+            local_path != photo_path
+            and photo_synced(photo, file_size, local_path, manifest)
+            and os.path.isfile(local_path)
+            and os.path.getsize(local_path) == int(photo.versions[file_size]["size"])
+        ):
+            return local_path
+    return None
+
+
+def copy_photo(source_path, photo_path):
+    """Copy the photo, sharing its blocks where the filesystem supports it."""
+    try:
+        with open(source_path, "rb") as source, open(photo_path, "wb") as target:
+            # copy_file_range reflinks on filesystems like btrfs and XFS
+            while os.copy_file_range(source.fileno(), target.fileno(), COPY_CHUNK_SIZE):
+                pass
+    except (AttributeError, OSError):
+        shutil.copyfile(source_path, photo_path)
+    shutil.copystat(source_path, photo_path)
+
+
+def link_photo(source_path, photo_path):
+    """Hardlink the photo to its synced copy, or copy it if links are not supported."""
+    LOGGER.info(f"Linking {source_path} to {photo_path} ...")
+    try:
+        Path(photo_path).unlink(missing_ok=True)
+        try:
+            os.link(source_path, photo_path)
+        except OSError:
+            copy_photo(source_path, photo_path)
+    except OSError as e:
+        LOGGER.error(f"Failed to link {photo_path}: {e}")
+        return False
+    return True
+
+
 def download_photo(photo, file_size, destination_path):
     """Download photo from server."""
     if not (photo and file_size and destination_path):
         return False
     LOGGER.info(f"Downloading {destination_path} ...")
+    error = fetch_photo(photo, file_size, destination_path)
+    if error is not None:
+        LOGGER.error(f"Failed to download {destination_path}: {error}")
+        return False
+    return True
+
+
+def fetch_photo(photo, file_size, destination_path):
+    """Download photo from server without logging, return the error or None."""
+    # Replacing the photo leaves the albums linked to its old version intact
+    part_path = destination_path + PART_FILE_SUFFIX
     try:
         download = photo.download(file_size)
-        with open(destination_path, "wb") as file_out:
+        with open(part_path, "wb") as file_out:
             shutil.copyfileobj(download.raw, file_out)
         local_modified_time = time.mktime(photo.added_date.timetuple())
-        os.utime(destination_path, (local_modified_time, local_modified_time))
+        os.utime(part_path, (local_modified_time, local_modified_time))
+        os.replace(part_path, destination_path)
     except (exceptions.ICloudPyAPIResponseException, FileNotFoundError, Exception) as e:
-        LOGGER.error(f"Failed to download {destination_path}: {str(e)}")
-        return False
-    return True
-
-
-def process_photo(photo, file_size, destination_path, files, folder_format):
-    """Process photo details."""
+        Path(part_path).unlink(missing_ok=True)
+        return str(e)
+    return None
+
+
+def fetch_and_record_photo(photo, file_size, destination_path, manifest=None):
+    """Download photo on a worker and record it, return the error or None."""
+    error = fetch_photo(photo, file_size, destination_path)
+    if error is None:
+        record_photo(photo, file_size, destination_path, manifest)
+    return error
+
+
+def finish_downloads(downloads, pending=0):
+    """Wait for the queued downloads in order until at most pending are left.
+
+    Return the number of failed downloads.
+    """
+    failed = 0
+    while len(downloads) > pending:
+        photo_path, download = downloads.popleft()
+        # Failures are logged in album order, whichever worker finished first
+        error = download.result()
+        if error is not None:
+            LOGGER.error(f"Failed to download {photo_path}: {error}")
+            failed += 1
+    return failed
+
+
+def sort_date(album, photo):
+    """Return the timestamp by which the album orders the photo."""
+    if "ByAddedDate" in album.list_type:
+        return photo.added_date.timestamp()
+    return photo.created.timestamp()
+
+
+def album_photos(album, watermark=None):
+    """Yield the album photos, or newest first down to the watermark if given."""
+    if watermark is None:
+        yield from album
+        return
+    direction = album.direction
+    album.direction = "DESCENDING"
+    try:
+        for photo in album:
+            # Photos sharing the watermark date are checked again
+            if sort_date(album, photo) < watermark:
+                break
+            yield photo
+    finally:
+        album.direction = direction
+
+
+def album_requests(album, paged, watermark=None):
+    """Return the estimated number of requests made to page the album."""
+    # An empty page ends the album, descending paging first counts the album
+    requests = -(-paged // album.page_size) + 1 + (watermark is not None)
+    # Folder albums list their subalbums
+    return requests + (album.folder_id is not None)
+
+
+def process_photo(
+    photo,
+    file_size,
+    destination_path,
+    files,
+    folder_format,
+    plan=None,
+    executor=None,
+    downloads=None,
+    manifest=None,
+    snapshots=None,
+):
+    """Process photo details, queueing its download on the executor if given."""
     photo_path = generate_file_name(
         photo=photo,
         file_size=file_size,
         destination_path=destination_path,
         folder_format=folder_format,
+        dry_run=True,
     )
     if file_size not in photo.versions:
         LOGGER.warning(
@@ -109,26 +296,127 @@ def process_photo(photo, file_size, destination_path, files, folder_format):
         return False
     if files is not None:
         files.add(photo_path)
+    # Recorded photos are skipped with one listing per folder instead of a stat each
+    if (
+        manifest is not None
+        and os.path.basename(photo_path)
+        in local_names(
+            os.path.dirname(photo_path), {} if snapshots is None else snapshots
+        )
+        and photo_synced(photo, file_size, photo_path, manifest)
+    ):
+        LOGGER.debug(f"No changes detected. Skipping the file {photo_path} ...")
+        if plan is not None:
+            plan.skip(photo_path)
+        return False
+    if plan is None:
+        generate_file_name(
+            photo=photo,
+            file_size=file_size,
+            destination_path=destination_path,
+            folder_format=folder_format,
+        )
     if photo_exists(photo, file_size, photo_path):
+        record_photo(photo, file_size, photo_path, manifest)
+        if plan is not None:
+            plan.skip(photo_path)
         return False
-    download_photo(photo, file_size, photo_path)
+    # A photo in several albums is downloaded once and linked into the others
+    source_path = (
+        synced_copy(photo, file_size, photo_path, manifest)
+        if manifest is not None
+        else None
+    )
+    if source_path is not None:
+        if plan is not None:
+            # Linking transfers nothing
+            plan.skip(photo_path)
+            return False
+        if link_photo(source_path, photo_path):
+            record_photo(photo, file_size, photo_path, manifest)
+            return False
+    if plan is not None:
+        plan.download(photo_path, int(photo.versions[file_size]["size"]))
+        return True
+    if executor is None:
+        if download_photo(photo, file_size, photo_path):
+            record_photo(photo, file_size, photo_path, manifest)
+    else:
+        LOGGER.info(f"Downloading {photo_path} ...")
+        downloads.append(
+            (
+                photo_path,
+                executor.submit(
+                    fetch_and_record_photo, photo, file_size, photo_path, manifest
+                ),
+            )
+        )
     return True
 
 
 def sync_album(
-    album, destination_path, file_sizes, extensions=None, files=None, folder_format=None
+    album,
+    destination_path,
+    file_sizes,
+    extensions=None,
+    files=None,
+    folder_format=None,
+    plan=None,
+    executor=None,
+    manifest=None,
+    library=None,
+    incremental=False,
 ):
-    """Sync given album."""
+    """Sync given album, or only plan it if a plan is given.
+
+    Photos are downloaded on the executor, if given, while the album is paged.
+    An incremental sync stops paging at the watermark of the last sync of
+    the album, which is moved up once every download succeeded.
+    """
     if album is None or destination_path is None or file_sizes is None:
         return None
-    os.makedirs(unicodedata.normalize("NFC", destination_path), exist_ok=True)
+    if plan is None:
+        os.makedirs(unicodedata.normalize("NFC", destination_path), exist_ok=True)
     LOGGER.info(f"Syncing {album.title}")
-    for photo in album:
+    watermark_key = f"{PHOTOS_WATERMARK_META_KEY}:{library}:{destination_path}"
+    watermark = (
+        manifest.get_meta(watermark_key)
+        if manifest is not None and incremental
+        else None
+    )
+    watermark = float(watermark) if watermark is not None else None
+    newest = watermark
+    downloads = deque()
+    failed = 0
+    paged = 0
+    snapshots = {}
+    for photo in album_photos(album, watermark):
+        paged += 1
+        if manifest is not None and executor is not None:
+            newest = max(sort_date(album, photo), newest or 0)
         if photo_wanted(photo, extensions):
             for file_size in file_sizes:
-                process_photo(photo, file_size, destination_path, files, folder_format)
+                process_photo(
+                    photo,
+                    file_size,
+                    destination_path,
+                    files,
+                    folder_format,
+                    plan,
+                    executor,
+                    downloads,
+                    manifest,
+                    snapshots,
+                )
+            failed += finish_downloads(downloads, pending=MAX_PENDING_DOWNLOADS)
         else:
             LOGGER.debug(f"Skipping the unwanted photo {photo.filename}.")
+    failed += finish_downloads(downloads)
+    # Only queued downloads report failures, so only they may move the watermark
+    if newest is not None and not failed:
+        manifest.set_meta(watermark_key, str(newest))
+    if plan is not None:
+        plan.request(album_requests(album, paged, watermark))
     for subalbum in album.subalbums:
         sync_album(
             album.subalbums[subalbum],
@@ -137,70 +425,256 @@ def sync_album(
             extensions,
             files,
             folder_format,
+            plan,
+            executor,
+            manifest,
+            library,
+            incremental,
         )
     return True
 
 
-def remove_obsolete(destination_path, files):
-    """Remove local obsolete file."""
+def sync_changes(
+    changes,
+    destination_path,
+    file_sizes,
+    extensions=None,
+    files=None,
+    folder_format=None,
+    plan=None,
+    executor=None,
+    manifest=None,
+):
+    """Sync the changed photos of a library, or only plan it if a plan is given.
+
+    Return True if every download succeeded.
+    """
+    if plan is None:
+        os.makedirs(unicodedata.normalize("NFC", destination_path), exist_ok=True)
+    LOGGER.info(f"Syncing the changes of {changes.library.zone_id['zoneName']}")
+    downloads = deque()
+    failed = 0
+    snapshots = {}
+    for photo in changes:
+        if photo_wanted(photo, extensions):
+            for file_size in file_sizes:
+                process_photo(
+                    photo,
+                    file_size,
+                    destination_path,
+                    files,
+                    folder_format,
+                    plan,
+                    executor,
+                    downloads,
+                    manifest,
+                    snapshots,
+                )
+            failed += finish_downloads(downloads, pending=MAX_PENDING_DOWNLOADS)
+        else:
+            LOGGER.debug(f"Skipping the unwanted photo {photo.filename}.")
+    failed += finish_downloads(downloads)
+    if plan is not None:
+        plan.request(changes.requests)
+    return not failed
+
+
+def find_obsolete(destination_path, files):
+    """Return the local files missing from files."""
+    return [
+        path
+        for path in Path(destination_path).rglob("*")
+        if str(path.absolute()) not in files and path.is_file()
+    ]
+
+
+def remove_obsolete(destination_path, files, obsolete=None):
+    """Remove local obsolete file, given or found below destination_path."""
     removed_paths = set()
     if not (destination_path and files is not None):
         return removed_paths
-    for path in Path(destination_path).rglob("*"):
+    obsolete = (
+        find_obsolete(destination_path, files)
+        if obsolete is None
+        else [Path(path) for path in obsolete]
+    )
+    for path in obsolete:
         local_file = str(path.absolute())
-        if local_file not in files:
-            if path.is_file():
-                LOGGER.info(f"Removing {local_file} ...")
-                path.unlink(missing_ok=True)
-                removed_paths.add(local_file)
+        LOGGER.info(f"Removing {local_file} ...")
+        path.unlink(missing_ok=True)
+        removed_paths.add(local_file)
     return removed_paths
 
 
-def sync_photos(config, photos):
-    """Sync all photos."""
-    destination_path = config_parser.prepare_photos_destination(config=config)
+def photos_incremental(config, manifest, filters_fingerprint, delta=False):
+    """Check if photos may be synced from the album watermarks or sync tokens."""
+    full_sync_interval = config_parser.get_photos_full_sync_interval(config=config)
+    last_full_sync = manifest.get_meta(PHOTOS_FULL_SYNC_META_KEY)
+    # Delta syncs are only made full by the interval, if one is set
+    incremental = (
+        (delta or full_sync_interval is not None)
+        and last_full_sync is not None
+        and (
+            full_sync_interval is None
+            or time.time() - float(last_full_sync) < full_sync_interval
+        )
+        and manifest.get_meta(PHOTOS_FILTERS_META_KEY) == filters_fingerprint
+    )
+    if not incremental:
+        LOGGER.info("Syncing all photos ...")
+    elif delta:
+        LOGGER.info("Syncing photos changed since the last sync ...")
+    else:
+        LOGGER.info("Syncing photos added since the last sync ...")
+    return incremental
+
+
+def remove_deleted(destination_path, files, deleted, plan=None, manifest=None):
+    """Remove the local files of the photos deleted in iCloud."""
+    obsolete = sorted(
+        path
+        for path in manifest.get_photo_paths(photo_ids=deleted)
+        if path not in files
+    )
+    if plan is None:
+        remove_obsolete(destination_path, files, obsolete=obsolete)
+    else:
+        for path in obsolete:
+            plan.delete(path)
+    manifest.forget_photos(local_paths=obsolete)
+
+
+def sync_photos(config, photos, plan=None):
+    """Sync all photos, or only plan the sync if a plan is given."""
+    destination_path = config_parser.prepare_photos_destination(
+        config=config, create=plan is None
+    )
     filters = config_parser.get_photos_filters(config=config)
-    files = set()
+    files = KeptPaths()
     download_all = config_parser.get_photos_all_albums(config=config)
     libraries = (
         filters["libraries"] if filters["libraries"] is not None else photos.libraries
     )
     folder_format = config_parser.get_photos_folder_format(config=config)
-    for library in libraries:
-        if download_all and library == "PrimarySync":
-            for album in photos.libraries[library].albums.keys():
-                if filters["albums"] and album in iter(filters["albums"]):
-                    continue
-                sync_album(
-                    album=photos.libraries[library].albums[album],
-                    destination_path=os.path.join(destination_path, album),
-                    file_sizes=filters["file_sizes"],
-                    extensions=filters["extensions"],
-                    files=files,
-                    folder_format=folder_format,
-                )
-        elif filters["albums"] and library == "PrimarySync":
-            for album in iter(filters["albums"]):
-                sync_album(
-                    album=photos.libraries[library].albums[album],
-                    destination_path=os.path.join(destination_path, album),
-                    file_sizes=filters["file_sizes"],
-                    extensions=filters["extensions"],
-                    files=files,
-                    folder_format=folder_format,
-                )
-        else:
-            sync_album(
-                album=photos.libraries[library].all,
-                destination_path=os.path.join(destination_path, "all"),
-                file_sizes=filters["file_sizes"],
-                extensions=filters["extensions"],
-                files=files,
-                folder_format=folder_format,
-            )
-
-    if config_parser.get_photos_remove_obsolete(config=config):
-        remove_obsolete(destination_path, files)
+    delta = config_parser.get_photos_delta_sync(config=config)
+    if delta and (download_all or filters["albums"]):
+        LOGGER.warning("Delta sync does not follow albums, syncing them in full ...")
+        delta = False
+    # Planning reads the manifest but leaves it as it was
+    manifest = Manifest(
+        file_path=init_manifest(config=config, create=plan is None),
+        read_only=plan is not None,
+    )
+    # Other filters need the photos recorded under them to be walked again
+    filters_fingerprint = json.dumps(
+        {
+            "filters": filters,
+            "all_albums": download_all,
+            "folder_format": folder_format,
+            "delta": delta,
+        }
+    )
+    try:
+        incremental = photos_incremental(
+            config=config,
+            manifest=manifest,
+            filters_fingerprint=filters_fingerprint,
+            delta=delta,
+        )
+        started = time.time()
+        deleted = set()
+        if plan is not None:
+            # Listing the libraries, checking their indexing and their albums
+            plan.request(1 + len(libraries) * (1 if delta else 2))
+        with ThreadPoolExecutor(
+            max_workers=config_parser.get_photos_max_concurrent_downloads(config=config)
+        ) as executor:
+            for library in libraries:
+                if download_all and library == "PrimarySync":
+                    for album in photos.libraries[library].albums.keys():
+                        if filters["albums"] and album in iter(filters["albums"]):
+                            continue
+                        sync_album(
+                            album=photos.libraries[library].albums[album],
+                            destination_path=os.path.join(destination_path, album),
+                            file_sizes=filters["file_sizes"],
+                            extensions=filters["extensions"],
+                            files=files,
+                            folder_format=folder_format,
+                            plan=plan,
+                            executor=executor,
+                            manifest=manifest,
+                            library=library,
+                            incremental=incremental,
+                        )
+                elif filters["albums"] and library == "PrimarySync":
+                    for album in iter(filters["albums"]):
+                        sync_album(
+                            album=photos.libraries[library].albums[album],
+                            destination_path=os.path.join(destination_path, album),
+                            file_sizes=filters["file_sizes"],
+                            extensions=filters["extensions"],
+                            files=files,
+                            folder_format=folder_format,
+                            plan=plan,
+                            executor=executor,
+                            manifest=manifest,
+                            library=library,
+                            incremental=incremental,
+                        )
+                elif delta:
+                    sync_token_key = f"{PHOTOS_SYNC_TOKEN_META_KEY}:{library}"
+                    # Without a sync token, all photos are listed as changes
+                    changes = LibraryChanges(
+                        library=photos.libraries[library],
+                        sync_token=(
+                            manifest.get_meta(sync_token_key) if incremental else None
+                        ),
+                        manifest=manifest,
+                    )
+                    if sync_changes(
+                        changes=changes,
+                        destination_path=os.path.join(destination_path, "all"),
+                        file_sizes=filters["file_sizes"],
+                        extensions=filters["extensions"],
+                        files=files,
+                        folder_format=folder_format,
+                        plan=plan,
+                        executor=executor,
+                        manifest=manifest,
+                    ):
+                        manifest.set_meta(sync_token_key, changes.sync_token)
+                    deleted.update(changes.deleted)
+                else:
+                    sync_album(
+                        album=photos.libraries[library].all,
+                        destination_path=os.path.join(destination_path, "all"),
+                        file_sizes=filters["file_sizes"],
+                        extensions=filters["extensions"],
+                        files=files,
+                        folder_format=folder_format,
+                        plan=plan,
+                        executor=executor,
+                        manifest=manifest,
+                        library=library,
+                        incremental=incremental,
+                    )
+
+        # Photos older than the watermarks are unknown to an incremental sync
+        if not incremental:
+            if config_parser.get_photos_remove_obsolete(config=config):
+                if plan is None:
+                    remove_obsolete(destination_path, files)
+                else:
+                    for path in find_obsolete(destination_path, files):
+                        plan.delete(str(path.absolute()))
+            manifest.retain_photos(local_paths=files)
+            manifest.set_meta(PHOTOS_FULL_SYNC_META_KEY, str(started))
+        elif deleted and config_parser.get_photos_remove_obsolete(config=config):
+            remove_deleted(destination_path, files, deleted, plan, manifest)
+        manifest.set_meta(PHOTOS_FILTERS_META_KEY, filters_fingerprint)
+    finally:
+        manifest.close()
 
 
 # def enable_debug():
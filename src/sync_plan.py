@@ -0,0 +1,63 @@
+"""Plan of a dry-run sync."""
+import threading
+
+from src import LOGGER
+
+
+class SyncPlan:
+    """Downloads, skips and deletions a sync would make, shared by the sync workers."""
+
+    def __init__(self):
+        """Create an empty plan."""
+        self.lock = threading.Lock()
+        self.downloads = []
+        self.download_bytes = 0
+        self.skips = 0
+        self.deletions = []
+        self.requests = 0
+
+    def download(self, path, size, requests=1):
+        """Plan the download of size bytes to path."""
+        LOGGER.info(f"Would download {path} ({size or 0} bytes) ...")
+        with self.lock:
+            self.downloads.append(path)
+            self.download_bytes += size or 0
+            self.requests += requests
+
+    def skip(self, path):
+        """Plan to keep the unchanged path."""
+        LOGGER.debug(f"Would skip {path} ...")
+        with self.lock:
+            self.skips += 1
+
+    def delete(self, path):
+        """Plan the removal of the obsolete path."""
+        LOGGER.info(f"Would remove {path} ...")
+        with self.lock:
+            self.deletions.append(path)
+
+    def request(self, count=1):
+        """Count requests made to plan the sync."""
+        with self.lock:
+            self.requests += count
+
+    def summary(self):
+        """Return the totals of the plan."""
+        with self.lock:
+            return {
+                "downloads": len(self.downloads),
+                "download_bytes": self.download_bytes,
+                "skips": self.skips,
+                "deletions": len(self.deletions),
+                "requests": self.requests,
+            }
+
+    def log_summary(self, name):
+        """Log the totals of the plan."""
+        summary = self.summary()
+        LOGGER.info(
+            f"Dry run of {name}: {summary['downloads']} downloads "
+            + f"({summary['download_bytes']} bytes), {summary['skips']} skips, "
+            + f"{summary['deletions']} deletions and {summary['requests']} requests."
+        )
+        return summary
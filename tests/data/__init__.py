@@ -1,6 +1,7 @@
 """Fixtures for tests."""
 __author__ = "Mandar Patil (mandarons@pm.me)"
 
+import copy
 import json
 import os
 
@@ -3717,6 +3718,67 @@ class ResponseMock(Response):
         return json.dumps(self.result)
 
 
+class PhotoChangesFake:
+    """Replayable change log of the photo zones.
+
+    A sync token is the position in the log of a zone, so the same token
+    always replays the same changes.
+    """
+
+    def __init__(self, page_size=4):
+        """Start the PrimarySync log with the photos of album-1."""
+        self.page_size = page_size
+        self.logs = {
+            "PrimarySync": copy.deepcopy(
+                photos_data.DATA["query?remapEnums=True&getCurrentSyncToken=True"][2][
+                    "response"
+                ]["records"]
+            )
+        }
+
+    def append(self, zone_name, records):
+        """Log changed records of the zone."""
+        self.logs.setdefault(zone_name, []).extend(copy.deepcopy(records))
+
+    def delete(self, zone_name, record_name):
+        """Log the tombstone of a record of the zone."""
+        self.append(zone_name, [{"recordName": record_name, "deleted": True}])
+
+    def response(self, data):
+        """Return the next page of changes of every requested zone."""
+        zones = []
+        for zone in data["zones"]:
+            log = self.logs.get(zone["zoneID"]["zoneName"], [])
+            start = int(zone.get("syncToken", 0))
+            end = min(start + self.page_size, len(log))
+            zones.append(
+                {
+                    "zoneID": zone["zoneID"],
+                    "records": [
+                        record
+                        for record in log[start:end]
+                        if record.get("deleted")
+                        or record["recordType"] in zone["desiredRecordTypes"]
+                    ],
+                    "syncToken": str(end),
+                    "moreComing": end < len(log),
+                }
+            )
+        return {"zones": zones}
+
+    def lookup(self, data):
+        """Return the latest records of the zone with the requested names."""
+        log = self.logs.get(data["zoneID"]["zoneName"], [])
+        records = []
+        for name in (record["recordName"] for record in data["records"]):
+            found = [record for record in log if record["recordName"] == name]
+            if found and not found[-1].get("deleted"):
+                records.append(found[-1])
+            else:
+                records.append({"recordName": name, "serverErrorCode": "NOT_FOUND"})
+        return {"records": records}
+
+
 class ICloudPySessionMock(base.ICloudPySession):
     """Mocked ICloudPySession."""
 
@@ -3886,6 +3948,10 @@ class ICloudPySessionMock(base.ICloudPySession):
         if "com.apple.photos.cloud" in url:
             if url.endswith("zones/list"):
                 return ResponseMock(ZONES_LIST_WORKING)
+            if "changes/zone" in url:
+                return ResponseMock(self.service.photo_changes.response(data))
+            if "records/lookup" in url:
+                return ResponseMock(self.service.photo_changes.lookup(data))
             if "query?remapEnums=True&getCurrentSyncToken=True" in url:
                 if data.get("query").get("recordType") == "CheckIndexingState":
                     return ResponseMock(
@@ -4161,6 +4227,7 @@ class ICloudPyServiceMock(base.ICloudPyService):
     ):
         """Init with defaults for optionals."""
         base.ICloudPySession = ICloudPySessionMock
+        self.photo_changes = PhotoChangesFake()
         base.ICloudPyService.__init__(
             self,
             apple_id,
@@ -8,7 +8,12 @@ import unittest
 import tests
 from src import (
     DEFAULT_DRIVE_DESTINATION,
+    DEFAULT_LISTING_BATCH_SIZE,
+    DEFAULT_MAX_CONCURRENT_DOWNLOADS,
+    DEFAULT_MAX_CONCURRENT_EXTRACTIONS,
+    DEFAULT_MAX_CONCURRENT_LISTINGS,
     DEFAULT_PHOTOS_DESTINATION,
+    DEFAULT_PHOTOS_MAX_CONCURRENT_DOWNLOADS,
     DEFAULT_RETRY_LOGIN_INTERVAL_SEC,
     DEFAULT_ROOT_DESTINATION,
     DEFAULT_SYNC_INTERVAL_SEC,
@@ -206,6 +211,116 @@ class TestConfigParser(unittest.TestCase):
         """Test for None config."""
         self.assertFalse(config_parser.get_drive_remove_obsolete(config=None))
 
+    def test_get_drive_max_concurrent_downloads(self):
+        """Test for given max concurrent downloads."""
+        config = read_config(config_path=tests.CONFIG_PATH)
+        config["drive"]["max_concurrent_downloads"] = 8
+        self.assertEqual(
+            8, config_parser.get_drive_max_concurrent_downloads(config=config)
+        )
+
+    def test_get_drive_max_concurrent_downloads_default(self):
+        """Test for default max concurrent downloads."""
+        config = read_config(config_path=tests.CONFIG_PATH)
+        config["drive"].pop("max_concurrent_downloads", None)
+        self.assertEqual(
+            DEFAULT_MAX_CONCURRENT_DOWNLOADS,
+            config_parser.get_drive_max_concurrent_downloads(config=config),
+        )
+
+    def test_get_drive_max_concurrent_downloads_invalid(self):
+        """Test for invalid max concurrent downloads."""
+        config = read_config(config_path=tests.CONFIG_PATH)
+        for value in [0, -2, "many", True]:
+            config["drive"]["max_concurrent_downloads"] = value
+            self.assertEqual(
+                DEFAULT_MAX_CONCURRENT_DOWNLOADS,
+                config_parser.get_drive_max_concurrent_downloads(config=config),
+            )
+
+    def test_get_drive_max_concurrent_downloads_none_config(self):
+        """Test for None config."""
+        self.assertEqual(
+            DEFAULT_MAX_CONCURRENT_DOWNLOADS,
+            config_parser.get_drive_max_concurrent_downloads(config=None),
+        )
+
+    def test_get_drive_max_concurrent_listings(self):
+        """Test for given max concurrent listings."""
+        config = read_config(config_path=tests.CONFIG_PATH)
+        config["drive"]["max_concurrent_listings"] = 16
+        self.assertEqual(
+            16, config_parser.get_drive_max_concurrent_listings(config=config)
+        )
+
+    def test_get_drive_max_concurrent_listings_default(self):
+        """Test for default max concurrent listings."""
+        config = read_config(config_path=tests.CONFIG_PATH)
+        config["drive"].pop("max_concurrent_listings", None)
+        self.assertEqual(
+            DEFAULT_MAX_CONCURRENT_LISTINGS,
+            config_parser.get_drive_max_concurrent_listings(config=config),
+        )
+        config["drive"]["max_concurrent_listings"] = 0
+        self.assertEqual(
+            DEFAULT_MAX_CONCURRENT_LISTINGS,
+            config_parser.get_drive_max_concurrent_listings(config=config),
+        )
+
+    def test_get_drive_listing_batch_size(self):
+        """Test for given and default listing batch size."""
+        config = read_config(config_path=tests.CONFIG_PATH)
+        config["drive"]["listing_batch_size"] = 100
+        self.assertEqual(100, config_parser.get_drive_listing_batch_size(config=config))
+        del config["drive"]["listing_batch_size"]
+        self.assertEqual(
+            DEFAULT_LISTING_BATCH_SIZE,
+            config_parser.get_drive_listing_batch_size(config=config),
+        )
+
+    def test_get_drive_max_concurrent_extractions(self):
+        """Test for given and default max concurrent extractions."""
+        config = read_config(config_path=tests.CONFIG_PATH)
+        config["drive"]["max_concurrent_extractions"] = 8
+        self.assertEqual(
+            8, config_parser.get_drive_max_concurrent_extractions(config=config)
+        )
+        del config["drive"]["max_concurrent_extractions"]
+        self.assertEqual(
+            DEFAULT_MAX_CONCURRENT_EXTRACTIONS,
+            config_parser.get_drive_max_concurrent_extractions(config=config),
+        )
+
+    def test_get_photos_max_concurrent_downloads(self):
+        """Test for given and default max concurrent photo downloads."""
+        config = read_config(config_path=tests.CONFIG_PATH)
+        config["photos"]["max_concurrent_downloads"] = 8
+        self.assertEqual(
+            8, config_parser.get_photos_max_concurrent_downloads(config=config)
+        )
+        config["photos"]["max_concurrent_downloads"] = 0
+        self.assertEqual(
+            DEFAULT_PHOTOS_MAX_CONCURRENT_DOWNLOADS,
+            config_parser.get_photos_max_concurrent_downloads(config=config),
+        )
+        del config["photos"]["max_concurrent_downloads"]
+        self.assertEqual(
+            DEFAULT_PHOTOS_MAX_CONCURRENT_DOWNLOADS,
+            config_parser.get_photos_max_concurrent_downloads(config=config),
+        )
+
+    def test_get_photos_full_sync_interval(self):
+        """Test for given and missing full photo sync interval."""
+        config = read_config(config_path=tests.CONFIG_PATH)
+        config["photos"]["full_sync_interval"] = 86400
+        self.assertEqual(
+            86400, config_parser.get_photos_full_sync_interval(config=config)
+        )
+        config["photos"]["full_sync_interval"] = 0
+        self.assertIsNone(config_parser.get_photos_full_sync_interval(config=config))
+        del config["photos"]["full_sync_interval"]
+        self.assertIsNone(config_parser.get_photos_full_sync_interval(config=config))
+
     def test_get_smtp_no_tls(self):
         """Test for no smtp tls."""
         config = {"app": {"smtp": {"no_tls": True}}}
@@ -434,6 +549,24 @@ class TestConfigParser(unittest.TestCase):
         config["photos"]["all_albums"] = False
         self.assertFalse(config_parser.get_photos_all_albums(config=config))
 
+    def test_get_dry_run_empty(self):
+        """Empty dry_run."""
+        config = read_config(config_path=tests.CONFIG_PATH)
+        self.assertFalse(config_parser.get_dry_run(config=config))
+
+    def test_get_dry_run_true(self):
+        """True dry_run."""
+        config = read_config(config_path=tests.CONFIG_PATH)
+        config["app"]["dry_run"] = True
+        self.assertTrue(config_parser.get_dry_run(config=config))
+
+    def test_get_photos_delta_sync(self):
+        """Test for empty and true delta_sync."""
+        config = read_config(config_path=tests.CONFIG_PATH)
+        self.assertFalse(config_parser.get_photos_delta_sync(config=config))
+        config["photos"]["delta_sync"] = True
+        self.assertTrue(config_parser.get_photos_delta_sync(config=config))
+
     def test_get_photos_folder_format_empty(self):
         """Empty folder_format."""
         config = read_config(config_path=tests.CONFIG_PATH)
@@ -0,0 +1,87 @@
+"""Tests for kept_paths.py file."""
+__author__ = "Mandar Patil (mandarons@pm.me)"
+
+import os
+import tracemalloc
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from src import kept_paths
+
+
+class TestKeptPaths(unittest.TestCase):
+    """Tests class for kept_paths.py file."""
+
+    def setUp(self) -> None:
+        """Initialize tests."""
+        self.paths = [
+            os.path.join("/icloud", "photos", f"{i // 1000}", f"IMG_{i:07}.JPG")
+            for i in range(5000)
+        ]
+
+    def test_add_and_contains(self):
+        """Test for kept paths membership."""
+        paths = kept_paths.KeptPaths(self.paths)
+        self.assertEqual(len(self.paths), len(paths))
+        for path in self.paths:
+            self.assertIn(path, paths)
+        self.assertNotIn("/icloud/photos/obsolete.JPG", paths)
+        paths.add(self.paths[0])
+        self.assertEqual(len(self.paths), len(paths))
+
+    def test_empty(self):
+        """Test for empty kept paths."""
+        paths = kept_paths.KeptPaths()
+        self.assertEqual(0, len(paths))
+        self.assertNotIn("/icloud", paths)
+
+    def test_key_collision(self):
+        """Test for colliding keys probing the next slot."""
+        with patch.object(kept_paths, "path_key", return_value=7):
+            paths = kept_paths.KeptPaths(["a"])
+            self.assertIn("b", paths)
+            self.assertEqual(1, len(paths))
+        with patch.object(kept_paths, "path_key", side_effect=len):
+            paths = kept_paths.KeptPaths(["a", "a" * 1025])
+            self.assertIn("a" * 1025, paths)
+            self.assertNotIn("a" * 2049, paths)
+
+    def test_concurrent_add(self):
+        """Test for paths added from several threads."""
+        paths = kept_paths.KeptPaths()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(paths.add, self.paths))
+        self.assertEqual(len(self.paths), len(paths))
+        for path in self.paths:
+            self.assertIn(path, paths)
+
+    def test_memory_benchmark(self):
+        """Benchmark memory of kept paths against a set of strings."""
+        count = 50000
+
+        def generate_paths():
+            for i in range(count):
+                yield os.path.join(
+                    "/icloud", "drive", "Documents", f"{i % 97}", f"file-{i}.pdf"
+                )
+
+        def allocated(build):
+            tracemalloc.start()
+            try:
+                snapshot = tracemalloc.take_snapshot()
+                kept = build(generate_paths())
+                size = sum(
+                    stat.size_diff
+                    for stat in tracemalloc.take_snapshot().compare_to(
+                        snapshot, "filename"
+                    )
+                )
+                self.assertEqual(count, len(kept))
+                return size
+            finally:
+                tracemalloc.stop()
+
+        set_size = allocated(set)
+        kept_size = allocated(kept_paths.KeptPaths)
+        self.assertLess(kept_size * 3, set_size)
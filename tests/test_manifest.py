@@ -0,0 +1,236 @@
+"""Tests for manifest.py file."""
+__author__ = "Mandar Patil (mandarons@pm.me)"
+
+import os
+import shutil
+import unittest
+from unittest.mock import patch
+
+import tests
+from src import manifest, read_config
+
+
+class TestManifest(unittest.TestCase):
+    """Tests class for manifest.py file."""
+
+    def setUp(self) -> None:
+        """Initialize tests."""
+        self.config = read_config(config_path=tests.CONFIG_PATH)
+        self.config["app"]["root"] = tests.TEMP_DIR
+        self.file_path = manifest.init_manifest(config=self.config)
+        self.manifest = manifest.Manifest(file_path=self.file_path)
+        self.item = {
+            "drivewsid": "FILE::com.apple.CloudDocs::1",
+            "type": "file",
+            "etag": "2k::2j",
+            "size": 197334,
+            "modified": 1588023456,
+            "local_path": os.path.join(tests.DRIVE_DIR, "file.pdf"),
+            "is_package": 0,
+        }
+
+    def tearDown(self) -> None:
+        """Remove temp directory."""
+        self.manifest.close()
+        shutil.rmtree(tests.TEMP_DIR)
+
+    def test_init_manifest(self):
+        """Test for manifest path in root destination."""
+        self.assertEqual(
+            os.path.join(os.path.abspath(tests.TEMP_DIR), manifest.MANIFEST_FILE_NAME),
+            self.file_path,
+        )
+        self.assertTrue(os.path.isfile(self.file_path))
+
+    def test_get_drive_item_missing(self):
+        """Test for unknown drive item."""
+        self.assertIsNone(self.manifest.get_drive_item("FILE::missing"))
+
+    def test_put_drive_item(self):
+        """Test for recording drive item."""
+        self.manifest.put_drive_item(**self.item)
+        self.assertDictEqual(
+            self.item, self.manifest.get_drive_item(self.item["drivewsid"])
+        )
+        self.manifest.put_drive_item(**{**self.item, "etag": "32::2x"})
+        self.assertEqual(
+            "32::2x", self.manifest.get_drive_item(self.item["drivewsid"])["etag"]
+        )
+
+    def test_put_drive_item_persisted(self):
+        """Test for drive items persisted across manifest instances."""
+        with patch.object(manifest, "COMMIT_EVERY", 1):
+            self.manifest.put_drive_item(**self.item)
+        other = manifest.Manifest(file_path=self.file_path)
+        self.addCleanup(other.close)
+        self.assertDictEqual(self.item, other.get_drive_item(self.item["drivewsid"]))
+
+    def test_meta(self):
+        """Test for recording meta values."""
+        self.assertIsNone(self.manifest.get_meta("drive_filters"))
+        self.manifest.set_meta("drive_filters", "{}")
+        self.assertEqual("{}", self.manifest.get_meta("drive_filters"))
+
+    def test_get_drive_items_under(self):
+        """Test for drive items below a local folder."""
+        folder = os.path.join(tests.DRIVE_DIR, "dir")
+        inside = {
+            **self.item,
+            "drivewsid": "1",
+            "local_path": os.path.join(folder, "a", "b.pdf"),
+        }
+        sibling = {**self.item, "drivewsid": "2", "local_path": folder + "1"}
+        self.manifest.put_drive_item(**{**self.item, "local_path": folder})
+        self.manifest.put_drive_item(**inside)
+        self.manifest.put_drive_item(**sibling)
+        self.assertListEqual([inside], self.manifest.get_drive_items_under(folder))
+
+    def test_retain_drive_items(self):
+        """Test for forgetting drive items no longer synced."""
+        other = {
+            **self.item,
+            "drivewsid": "2",
+            "local_path": self.item["local_path"] + "1",
+        }
+        self.manifest.put_drive_item(**self.item)
+        self.manifest.put_drive_item(**other)
+        self.assertEqual(
+            1, self.manifest.retain_drive_items(local_paths={self.item["local_path"]})
+        )
+        self.assertIsNone(self.manifest.get_drive_item("2"))
+        self.assertIsNotNone(self.manifest.get_drive_item(self.item["drivewsid"]))
+
+    def test_package_members(self):
+        """Test for recording package members."""
+        package_path = os.path.join(tests.DRIVE_DIR, "Project.band")
+        members = [os.path.join(package_path, "projectData")]
+        self.assertIsNone(self.manifest.get_package_members(package_path))
+        self.manifest.put_package_members(package_path=package_path, members=members)
+        self.manifest.put_package_members(package_path=package_path, members=members)
+        self.assertListEqual(members, self.manifest.get_package_members(package_path))
+        self.manifest.retain_drive_items(local_paths=set())
+        self.assertIsNone(self.manifest.get_package_members(package_path))
+
+    def test_move_drive_items(self):
+        """Test for moving recorded items below a folder."""
+        folder = os.path.join(tests.DRIVE_DIR, "dir")
+        moved = os.path.join(tests.DRIVE_DIR, "moved")
+        package_path = os.path.join(folder, "Project.band")
+        member_path = os.path.join(package_path, "projectData")
+        self.manifest.put_drive_item(
+            **{**self.item, "drivewsid": "1", "local_path": folder}
+        )
+        self.manifest.put_drive_item(
+            **{**self.item, "drivewsid": "2", "local_path": package_path}
+        )
+        self.manifest.put_drive_item(
+            **{**self.item, "drivewsid": "3", "local_path": folder + "1"}
+        )
+        self.manifest.put_package_members(
+            package_path=package_path, members=[member_path]
+        )
+        self.manifest.move_drive_items(previous_path=folder, local_path=moved)
+        self.assertEqual(moved, self.manifest.get_drive_item("1")["local_path"])
+        self.assertEqual(
+            os.path.join(moved, "Project.band"),
+            self.manifest.get_drive_item("2")["local_path"],
+        )
+        self.assertEqual(folder + "1", self.manifest.get_drive_item("3")["local_path"])
+        self.assertListEqual(
+            [os.path.join(moved, "Project.band", "projectData")],
+            self.manifest.get_package_members(os.path.join(moved, "Project.band")),
+        )
+
+    def test_read_only(self):
+        """Test for read only manifest discarding its writes."""
+        self.manifest.put_drive_item(**self.item)
+        self.manifest.close()
+        self.manifest = manifest.Manifest(file_path=self.file_path, read_only=True)
+        with patch.object(manifest, "COMMIT_EVERY", 1):
+            self.manifest.put_drive_item(**{**self.item, "etag": "32::2x"})
+        self.manifest.set_meta("drive_filters", "{}")
+        self.assertEqual(
+            "32::2x", self.manifest.get_drive_item(self.item["drivewsid"])["etag"]
+        )
+        self.manifest.close()
+        self.manifest = manifest.Manifest(file_path=self.file_path)
+        self.assertDictEqual(
+            self.item, self.manifest.get_drive_item(self.item["drivewsid"])
+        )
+        self.assertIsNone(self.manifest.get_meta("drive_filters"))
+
+    def test_read_only_leaves_the_file_alone(self):
+        """Test for a read only manifest not locking or changing the file."""
+        self.manifest.put_drive_item(**self.item)
+        self.manifest.close()
+        modified = os.stat(self.file_path).st_mtime_ns
+        read_only = manifest.Manifest(file_path=self.file_path, read_only=True)
+        read_only.put_drive_item(**{**self.item, "etag": "32::2x"})
+        self.assertEqual(modified, os.stat(self.file_path).st_mtime_ns)
+        # A running sync still writes while the plan is open
+        self.manifest = manifest.Manifest(file_path=self.file_path)
+        self.manifest.set_meta("drive_filters", "{}")
+        self.assertIsNone(read_only.get_meta("drive_filters"))
+        read_only.close()
+        self.assertEqual("{}", self.manifest.get_meta("drive_filters"))
+        self.assertDictEqual(
+            self.item, self.manifest.get_drive_item(self.item["drivewsid"])
+        )
+
+    def test_photos(self):
+        """Test for recording and retaining photos."""
+        photo = {
+            "photo_id": "AVx3/VKkbWPdNbWw68mrWzSuemXg",
+            "version": "original",
+            "local_path": os.path.join(tests.PHOTOS_DIR, "album-1", "IMG_3148.JPG"),
+            "size": 2194253,
+            "checksum": "AVx3/VKkbWPdNbWw68mrWzSuemXg",
+        }
+        self.assertIsNone(
+            self.manifest.get_photo(
+                photo["photo_id"], photo["version"], photo["local_path"]
+            )
+        )
+        self.manifest.put_photo(**photo)
+        other_album = {
+            **photo,
+            "local_path": os.path.join(tests.PHOTOS_DIR, "album-2", "IMG_3148.JPG"),
+        }
+        self.manifest.put_photo(**other_album)
+        self.assertDictEqual(
+            photo,
+            self.manifest.get_photo(
+                photo["photo_id"], photo["version"], photo["local_path"]
+            ),
+        )
+        self.assertEqual(1, self.manifest.retain_photos({photo["local_path"]}))
+        self.assertIsNone(
+            self.manifest.get_photo(
+                photo["photo_id"], photo["version"], other_album["local_path"]
+            )
+        )
+
+    def test_photo_paths(self):
+        """Test for finding and forgetting the paths of photos."""
+        for photo_id, name in [("photo-1", "a.JPG"), ("photo-2", "b.JPG")]:
+            for version in ["original", "medium"]:
+                self.manifest.put_photo(
+                    photo_id=photo_id,
+                    version=version,
+                    local_path=os.path.join(tests.PHOTOS_DIR, f"{version}-{name}"),
+                )
+        self.assertListEqual(
+            [os.path.join(tests.PHOTOS_DIR, "medium-a.JPG")],
+            self.manifest.get_photo_copies("photo-1", "medium"),
+        )
+        deleted = self.manifest.get_photo_paths(photo_ids={"photo-1", "unknown"})
+        self.assertSetEqual(
+            {
+                os.path.join(tests.PHOTOS_DIR, "original-a.JPG"),
+                os.path.join(tests.PHOTOS_DIR, "medium-a.JPG"),
+            },
+            deleted,
+        )
+        self.manifest.forget_photos(local_paths=deleted)
+        self.assertSetEqual(set(), self.manifest.get_photo_paths(photo_ids={"photo-1"}))
+        self.assertEqual(2, len(self.manifest.get_photo_paths(photo_ids={"photo-2"})))
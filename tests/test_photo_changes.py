@@ -0,0 +1,146 @@
+"""Tests for photo_changes.py file."""
+__author__ = "Mandar Patil (mandarons@pm.me)"
+
+import copy
+import unittest
+from unittest.mock import MagicMock
+
+from src.photo_changes import LibraryChanges
+from tests import data
+from tests.data import photos_data
+
+ALBUM_RECORDS = photos_data.DATA["query?remapEnums=True&getCurrentSyncToken=True"][2][
+    "response"
+]["records"]
+
+
+def album_record(record_name):
+    """Return a copy of the album-1 record with the given name."""
+    return copy.deepcopy(
+        next(record for record in ALBUM_RECORDS if record["recordName"] == record_name)
+    )
+
+
+class TestPhotoChanges(unittest.TestCase):
+    """Tests class for photo_changes.py file."""
+
+    def setUp(self) -> None:
+        """Initialize tests."""
+        self.service = data.ICloudPyServiceMock(
+            data.AUTHENTICATED_USER, data.VALID_PASSWORD
+        )
+        self.library = self.service.photos.libraries["PrimarySync"]
+        self.log = self.service.photo_changes.logs["PrimarySync"]
+
+    def test_all_photos_without_sync_token(self):
+        """Test for listing every photo of the zone as changed."""
+        changes = LibraryChanges(library=self.library)
+        photos = list(changes)
+        # Masters and assets are paired across pages
+        self.assertEqual(7, len(photos))
+        self.assertIn("IMG_3328.JPG", [photo.filename for photo in photos])
+        self.assertEqual(str(len(self.log)), changes.sync_token)
+        self.assertSetEqual(set(), changes.deleted)
+
+    def test_changes_since_sync_token(self):
+        """Test for listing only the changes since the sync token."""
+        changes = LibraryChanges(library=self.library)
+        list(changes)
+        asset = next(
+            record
+            for record in self.log
+            if record["recordType"] == "CPLAsset"
+            and record["fields"]["masterRef"]["value"]["recordName"]
+            == "ENKzBUr+DdmTaP/GEAglTurWtsen"
+        )
+        # Asset first, master later: the photo is still yielded
+        self.service.photo_changes.append(
+            "PrimarySync", [asset, album_record("ENKzBUr+DdmTaP/GEAglTurWtsen")]
+        )
+        changes = LibraryChanges(library=self.library, sync_token=changes.sync_token)
+        self.assertEqual(["IMG_3327.JPG"], [photo.filename for photo in changes])
+
+        deleted_asset = copy.deepcopy(asset)
+        deleted_asset["fields"]["isDeleted"] = {"value": 1, "type": "INT64"}
+        # Metadata changes come without the master and are not yielded
+        self.service.photo_changes.append(
+            "PrimarySync",
+            [album_record("YN1v8eGiHYYZ/aKUkMuGtSf0P1BN"), deleted_asset],
+        )
+        self.service.photo_changes.delete("PrimarySync", "YN1v8eGiHYYZ/aKUkMuGtSf0P1BN")
+        changes = LibraryChanges(library=self.library, sync_token=changes.sync_token)
+        self.assertListEqual([], list(changes))
+        self.assertSetEqual(
+            {"ENKzBUr+DdmTaP/GEAglTurWtsen", "YN1v8eGiHYYZ/aKUkMuGtSf0P1BN"},
+            changes.deleted,
+        )
+        self.assertEqual(str(len(self.log)), changes.sync_token)
+
+    def test_restored_photos(self):
+        """Test for yielding restored photos missing from the manifest."""
+        changes = LibraryChanges(library=self.library)
+        list(changes)
+        assets = {
+            record["fields"]["masterRef"]["value"]["recordName"]: record
+            for record in self.log
+            if record["recordType"] == "CPLAsset"
+        }
+        deleted_asset = copy.deepcopy(assets["ENKzBUr+DdmTaP/GEAglTurWtsen"])
+        deleted_asset["fields"]["isDeleted"] = {"value": 1, "type": "INT64"}
+        # Deleted then restored, and a metadata change of a recorded photo
+        self.service.photo_changes.append(
+            "PrimarySync",
+            [
+                deleted_asset,
+                assets["ENKzBUr+DdmTaP/GEAglTurWtsen"],
+                assets["YN1v8eGiHYYZ/aKUkMuGtSf0P1BN"],
+            ],
+        )
+        self.service.photo_changes.delete("PrimarySync", "AUxVFT2yVsQ5739tmU5c1497duFD")
+        manifest = MagicMock()
+        manifest.get_photo_paths.side_effect = lambda photo_ids: (
+            {"recorded"} if photo_ids == ["YN1v8eGiHYYZ/aKUkMuGtSf0P1BN"] else set()
+        )
+        changes = LibraryChanges(
+            library=self.library, sync_token=changes.sync_token, manifest=manifest
+        )
+        self.assertEqual(["IMG_3327.JPG"], [photo.filename for photo in changes])
+        self.assertSetEqual({"AUxVFT2yVsQ5739tmU5c1497duFD"}, changes.deleted)
+        # A page of changes and a lookup
+        self.assertEqual(2, changes.requests)
+
+    def test_hidden_photos(self):
+        """Test for hidden photos being removed like deleted ones."""
+        changes = LibraryChanges(library=self.library)
+        list(changes)
+        assets = {
+            record["fields"]["masterRef"]["value"]["recordName"]: record
+            for record in self.log
+            if record["recordType"] == "CPLAsset"
+        }
+        hidden_asset = copy.deepcopy(assets["ENKzBUr+DdmTaP/GEAglTurWtsen"])
+        hidden_asset["fields"]["isHidden"] = {"value": 1, "type": "INT64"}
+        self.service.photo_changes.append(
+            "PrimarySync", [album_record("ENKzBUr+DdmTaP/GEAglTurWtsen"), hidden_asset]
+        )
+        changes = LibraryChanges(library=self.library, sync_token=changes.sync_token)
+        self.assertListEqual([], list(changes))
+        self.assertSetEqual({"ENKzBUr+DdmTaP/GEAglTurWtsen"}, changes.deleted)
+
+        # Unhidden, the photo missing from the manifest comes back
+        manifest = MagicMock()
+        manifest.get_photo_paths.return_value = set()
+        self.service.photo_changes.append(
+            "PrimarySync", [assets["ENKzBUr+DdmTaP/GEAglTurWtsen"]]
+        )
+        changes = LibraryChanges(
+            library=self.library, sync_token=changes.sync_token, manifest=manifest
+        )
+        self.assertEqual(["IMG_3327.JPG"], [photo.filename for photo in changes])
+        self.assertSetEqual(set(), changes.deleted)
+
+    def test_no_changes(self):
+        """Test for an unchanged zone keeping its sync token."""
+        changes = LibraryChanges(library=self.library, sync_token=str(len(self.log)))
+        self.assertListEqual([], list(changes))
+        self.assertEqual(str(len(self.log)), changes.sync_token)
@@ -3,12 +3,15 @@ __author__ = "Mandar Patil (mandarons@pm.me)"
 
 import os
 import shutil
+import threading
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from io import StringIO
 from unittest.mock import patch
 
 import tests
-from src import ENV_ICLOUD_PASSWORD_KEY, read_config, sync
+from src import ENV_ICLOUD_PASSWORD_KEY, LOGGER, manifest, read_config, sync
 from tests import data
 
 
@@ -86,10 +89,13 @@ class TestSyncDrive(unittest.TestCase):
         mock_read_config.return_value = config
         self.assertIsNone(sync.sync())
         dir_length = len(os.listdir(self.root_dir))
-        self.assertTrue(2 == dir_length)
+        self.assertTrue(3 == dir_length)
         self.assertTrue(
             os.path.isdir(os.path.join(self.root_dir, config["photos"]["destination"]))
         )
+        self.assertTrue(
+            os.path.isfile(os.path.join(self.root_dir, manifest.MANIFEST_FILE_NAME))
+        )
 
     @patch(target="keyring.get_password", return_value=data.VALID_PASSWORD)
     @patch(
@@ -119,8 +125,90 @@ class TestSyncDrive(unittest.TestCase):
         self.assertTrue(
             os.path.isdir(os.path.join(self.root_dir, config["drive"]["destination"]))
         )
+        self.assertTrue(
+            os.path.isfile(os.path.join(self.root_dir, manifest.MANIFEST_FILE_NAME))
+        )
         dir_length = len(os.listdir(self.root_dir))
-        self.assertTrue(2 == dir_length)
+        self.assertTrue(3 == dir_length)
+
+        # Skip unchanged drive
+        with patch.object(sync.sync_drive, "sync_drive") as mocked_sync_drive:
+            with self.assertLogs(logger=LOGGER, level="INFO") as captured:
+                self.assertIsNone(sync.sync())
+            mocked_sync_drive.assert_not_called()
+        self.assertIn(
+            "No changes detected in drive.",
+            [record.getMessage() for record in captured.records],
+        )
+
+    @patch(target="keyring.get_password", return_value=data.VALID_PASSWORD)
+    @patch(
+        target="src.config_parser.get_username", return_value=data.AUTHENTICATED_USER
+    )
+    @patch("icloudpy.ICloudPyService")
+    @patch("src.sync.read_config")
+    @patch("requests.post", side_effect=tests.mocked_usage_post)
+    def test_sync_dry_run(
+        self,
+        mock_usage_post,
+        mock_read_config,
+        mock_service,
+        mock_get_username,
+        mock_get_password,
+    ):
+        """Test for planning a single sync without downloading anything."""
+        if ENV_ICLOUD_PASSWORD_KEY in os.environ:
+            del os.environ[ENV_ICLOUD_PASSWORD_KEY]
+        config = self.config.copy()
+        config["drive"]["sync_interval"] = 300
+        config["photos"]["sync_interval"] = 300
+        self.remove_temp()
+        mock_read_config.return_value = config
+        with patch.object(sync, "sleep") as mocked_sleep:
+            with self.assertLogs(logger=LOGGER, level="INFO") as captured:
+                self.assertIsNone(sync.sync(dry_run=True))
+            mocked_sleep.assert_not_called()
+        messages = [record.getMessage() for record in captured.records]
+        self.assertIn("Planning drive sync...", messages)
+        self.assertIn("Planning photos sync...", messages)
+        self.assertNotIn("Drive synced", messages)
+        self.assertTrue(any(m.startswith("Dry run of drive: ") for m in messages))
+        self.assertTrue(any(m.startswith("Dry run of photos: ") for m in messages))
+        # Only the usage cache is written to the root
+        self.assertListEqual([".data"], os.listdir(self.root_dir))
+
+    @patch(target="keyring.get_password", return_value=data.VALID_PASSWORD)
+    @patch(
+        target="src.config_parser.get_username", return_value=data.AUTHENTICATED_USER
+    )
+    @patch("icloudpy.ICloudPyService")
+    @patch("src.sync.read_config")
+    @patch("requests.post", side_effect=tests.mocked_usage_post)
+    def test_sync_dry_run_from_config(
+        self,
+        mock_usage_post,
+        mock_read_config,
+        mock_service,
+        mock_get_username,
+        mock_get_password,
+    ):
+        """Test for planning the sync when dry_run is set in config."""
+        if ENV_ICLOUD_PASSWORD_KEY in os.environ:
+            del os.environ[ENV_ICLOUD_PASSWORD_KEY]
+        config = self.config.copy()
+        config["app"]["dry_run"] = True
+        del config["photos"]
+        self.remove_temp()
+        mock_read_config.return_value = config
+        with patch.object(sync.sync_drive, "download_file") as mocked_download:
+            self.assertIsNone(sync.sync())
+            mocked_download.assert_not_called()
+        self.assertFalse(
+            os.path.exists(os.path.join(self.root_dir, config["drive"]["destination"]))
+        )
+        self.assertFalse(
+            os.path.isfile(os.path.join(self.root_dir, manifest.MANIFEST_FILE_NAME))
+        )
 
     @patch(target="keyring.get_password", return_value=data.VALID_PASSWORD)
     @patch(
@@ -339,6 +427,36 @@ class TestSyncDrive(unittest.TestCase):
         self.assertEqual(mock_sync_drive.sync_drive.call_count, 6)
         self.assertEqual(mock_sync_photos.sync_photos.call_count, 3)
 
+    def test_serialize_requests(self):
+        """Test for one request at a time on a session shared by workers."""
+        active = []
+        overlapped = threading.Event()
+
+        class Session:
+            """Session recording the requests in flight."""
+
+            def request(self, method, url, **kwargs):
+                """Record the request while it is in flight."""
+                if any(other != url for other in active):
+                    overlapped.set()
+                active.append(url)
+                time.sleep(0.01)
+                if kwargs.get("retry"):
+                    # Retries go through the locked request again
+                    self.request(method, url)
+                active.remove(url)
+                return url
+
+        session = sync.serialize_requests(Session())
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            urls = list(
+                executor.map(
+                    lambda i: session.request("GET", str(i), retry=i % 2), range(8)
+                )
+            )
+        self.assertListEqual([str(i) for i in range(8)], urls)
+        self.assertFalse(overlapped.is_set())
+
     @patch("src.sync.read_config")
     def test_get_api_instance_default(
         self,
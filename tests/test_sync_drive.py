@@ -1,15 +1,20 @@
 """Tests for sync_drive.py file."""
 __author__ = "Mandar Patil (mandarons@pm.me)"
 
+import io
 import os
 import shutil
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from unittest.mock import patch
 
 from icloudpy.exceptions import ICloudPyAPIResponseException
 
 import tests
 from src import LOGGER, read_config, sync_drive
+from src.manifest import MANIFEST_FILE_NAME, Manifest
+from src.sync_plan import SyncPlan
 from tests import DATA_DIR, data
 
 
@@ -19,6 +24,7 @@ class TestSyncDrive(unittest.TestCase):
     def setUp(self) -> None:
         """Initialize tests."""
         self.config = read_config(config_path=tests.CONFIG_PATH)
+        self.config["app"]["root"] = tests.TEMP_DIR
         self.ignore = self.config["drive"]["ignore"]
         self.filters = self.config["drive"]["filters"]
         self.root = tests.DRIVE_DIR
@@ -675,6 +681,64 @@ class TestSyncDrive(unittest.TestCase):
             self.assertTrue(len(captured.records) > 0)
             self.assertIn("No changes detected.", captured.records[0].getMessage())
 
+    def test_file_exists_from_snapshot(self):
+        """Test for file checks answered by the folder snapshot."""
+        sync_drive.download_file(item=self.file_item, local_file=self.local_file_path)
+        snapshot = sync_drive.scan_folder(self.destination_path)
+        with patch.object(sync_drive.os, "stat") as mocked_stat:
+            self.assertTrue(
+                sync_drive.file_exists(
+                    item=self.file_item,
+                    local_file=self.local_file_path,
+                    snapshot=snapshot,
+                )
+            )
+            self.assertFalse(
+                sync_drive.file_exists(
+                    item=self.file_item,
+                    local_file=self.local_file_path,
+                    snapshot={},
+                )
+            )
+            mocked_stat.assert_not_called()
+
+    def test_scan_folder_missing(self):
+        """Test for the snapshot of a missing folder."""
+        self.assertDictEqual(
+            {}, sync_drive.scan_folder(os.path.join(self.destination_path, "missing"))
+        )
+
+    def test_stat_local_path_removed(self):
+        """Test for a snapshot entry removed before its stat."""
+        Path(self.local_file_path).touch()
+        snapshot = sync_drive.scan_folder(self.destination_path)
+        os.remove(self.local_file_path)
+        self.assertIsNone(sync_drive.stat_local_path(self.local_file_path, snapshot))
+        self.assertIsNone(sync_drive.stat_local_path(self.local_file_path))
+
+    def test_traverse_directory_existing_folders(self):
+        """Test for existing folders not being created again."""
+        sync_drive.sync_directory(
+            drive=self.drive,
+            destination_path=self.destination_path,
+            items=self.drive.dir(),
+            root=self.root,
+            filters=self.filters,
+            ignore=self.ignore,
+        )
+        with patch.object(sync_drive.os, "makedirs") as mocked_makedirs, patch.object(
+            sync_drive, "download_file"
+        ):
+            sync_drive.sync_directory(
+                drive=self.drive,
+                destination_path=self.destination_path,
+                items=self.drive.dir(),
+                root=self.root,
+                filters=self.filters,
+                ignore=self.ignore,
+            )
+            mocked_makedirs.assert_not_called()
+
     def test_file_exists_none_item(self):
         """Test if item is None."""
         self.assertFalse(
@@ -734,6 +798,168 @@ class TestSyncDrive(unittest.TestCase):
                 )
             )
 
+    def test_download_file_resume(self):
+        """Test for resuming a partial download with a Range request."""
+        content = b"0123456789"
+        part_file = self.local_file_path + sync_drive.PART_FILE_SUFFIX
+        with open(part_file, "wb") as f:
+            f.write(content[:4])
+        etag_file = self.local_file_path + sync_drive.PART_ETAG_SUFFIX
+        with open(etag_file, "w", encoding="utf-8") as f:
+            f.write(self.file_item.data["etag"])
+        self.file_item.data["size"] = len(content)
+        with patch.object(self.file_item, "open") as mock_open:
+            mock_open.return_value = data.ResponseMock(
+                {}, status_code=206, raw=io.BytesIO(content[4:])
+            )
+            self.assertTrue(
+                sync_drive.download_file(
+                    item=self.file_item, local_file=self.local_file_path
+                )
+            )
+            mock_open.assert_called_once_with(
+                stream=True, headers={"Range": "bytes=4-"}
+            )
+        with open(self.local_file_path, "rb") as f:
+            self.assertEqual(content, f.read())
+        self.assertFalse(os.path.exists(part_file))
+        self.assertFalse(os.path.exists(etag_file))
+
+    def test_download_file_changed_part(self):
+        """Test for restarting the download of a file changed since the partial one."""
+        content = b"0123456789"
+        part_file = self.local_file_path + sync_drive.PART_FILE_SUFFIX
+        etag_file = self.local_file_path + sync_drive.PART_ETAG_SUFFIX
+        self.file_item.data["size"] = len(content)
+        for etag in ("changed", None):
+            with open(part_file, "wb") as f:
+                f.write(b"xxxx")
+            if etag is not None:
+                with open(etag_file, "w", encoding="utf-8") as f:
+                    f.write(etag)
+            with patch.object(self.file_item, "open") as mock_open:
+                mock_open.return_value = data.ResponseMock({}, raw=io.BytesIO(content))
+                self.assertTrue(
+                    sync_drive.download_file(
+                        item=self.file_item, local_file=self.local_file_path
+                    )
+                )
+                mock_open.assert_called_once_with(stream=True, headers={})
+            with open(self.local_file_path, "rb") as f:
+                self.assertEqual(content, f.read())
+            self.assertFalse(os.path.exists(etag_file))
+
+    def test_download_file_interrupted(self):
+        """Test for keeping the etag of an interrupted download."""
+        part_file = self.local_file_path + sync_drive.PART_FILE_SUFFIX
+        self.file_item.data["size"] = 10
+
+        def chunks(chunk_size):
+            yield b"0123"
+            raise ConnectionError("reset")
+
+        with patch.object(self.file_item, "open") as mock_open:
+            response = data.ResponseMock({})
+            response.iter_content = chunks
+            mock_open.return_value = response
+            self.assertFalse(
+                sync_drive.download_file(
+                    item=self.file_item, local_file=self.local_file_path
+                )
+            )
+        with open(part_file, "rb") as f:
+            self.assertEqual(b"0123", f.read())
+        self.assertEqual(
+            self.file_item.data["etag"],
+            sync_drive.part_etag(local_file=self.local_file_path),
+        )
+
+    def test_download_file_range_not_honored(self):
+        """Test for restarting the download when the Range is ignored."""
+        content = b"0123456789"
+        part_file = self.local_file_path + sync_drive.PART_FILE_SUFFIX
+        with open(part_file, "wb") as f:
+            f.write(b"xxxx")
+        with open(
+            self.local_file_path + sync_drive.PART_ETAG_SUFFIX, "w", encoding="utf-8"
+        ) as f:
+            f.write(self.file_item.data["etag"])
+        self.file_item.data["size"] = len(content)
+        with patch.object(self.file_item, "open") as mock_open:
+            mock_open.return_value = data.ResponseMock({}, raw=io.BytesIO(content))
+            self.assertTrue(
+                sync_drive.download_file(
+                    item=self.file_item, local_file=self.local_file_path
+                )
+            )
+            mock_open.assert_called_once_with(
+                stream=True, headers={"Range": "bytes=4-"}
+            )
+        with open(self.local_file_path, "rb") as f:
+            self.assertEqual(content, f.read())
+
+    def test_download_file_stale_part(self):
+        """Test for restarting the download when the partial file is too large."""
+        content = b"0123456789"
+        part_file = self.local_file_path + sync_drive.PART_FILE_SUFFIX
+        with open(part_file, "wb") as f:
+            f.write(content + content)
+        self.file_item.data["size"] = len(content)
+        with patch.object(self.file_item, "open") as mock_open:
+            mock_open.return_value = data.ResponseMock({}, raw=io.BytesIO(content))
+            self.assertTrue(
+                sync_drive.download_file(
+                    item=self.file_item, local_file=self.local_file_path
+                )
+            )
+            mock_open.assert_called_once_with(stream=True, headers={})
+        with open(self.local_file_path, "rb") as f:
+            self.assertEqual(content, f.read())
+
+    def test_download_file_resume_size_mismatch(self):
+        """Test for discarding a resumed download of a changed file."""
+        part_file = self.local_file_path + sync_drive.PART_FILE_SUFFIX
+        with open(part_file, "wb") as f:
+            f.write(b"0123")
+        etag_file = self.local_file_path + sync_drive.PART_ETAG_SUFFIX
+        with open(etag_file, "w", encoding="utf-8") as f:
+            f.write(self.file_item.data["etag"])
+        self.file_item.data["size"] = 10
+        with patch.object(self.file_item, "open") as mock_open:
+            mock_open.return_value = data.ResponseMock(
+                {}, status_code=206, raw=io.BytesIO(b"45")
+            )
+            self.assertFalse(
+                sync_drive.download_file(
+                    item=self.file_item, local_file=self.local_file_path
+                )
+            )
+        self.assertFalse(os.path.exists(part_file))
+        self.assertFalse(os.path.exists(etag_file))
+        self.assertFalse(os.path.exists(self.local_file_path))
+
+    def test_process_file_keeps_partial_download(self):
+        """Test for keeping the partial download of a failed file."""
+        files = set()
+        part_file = self.local_file_path + sync_drive.PART_FILE_SUFFIX
+
+        def download_file(item, local_file, extraction_executor=None):
+            Path(part_file).touch()
+            return False
+
+        with patch.object(sync_drive, "download_file", side_effect=download_file):
+            self.assertTrue(
+                sync_drive.process_file(
+                    item=self.file_item,
+                    destination_path=self.destination_path,
+                    filters=self.filters["file_extensions"],
+                    ignore=None,
+                    files=files,
+                )
+            )
+        self.assertIn(part_file, files)
+        self.assertIn(self.local_file_path + sync_drive.PART_ETAG_SUFFIX, files)
+
     def test_process_file_non_existing(self):
         """Test for non-existing file."""
         files = set()
@@ -916,6 +1142,53 @@ class TestSyncDrive(unittest.TestCase):
             self.assertTrue(len(captured.records) > 0)
             self.assertIn("Removing ", captured.records[0].getMessage())
 
+    def test_remove_obsolete_prunes_removed_directories(self):
+        """Test for not walking obsolete directories before removing them."""
+        kept_path = os.path.join(self.destination_path, "kept")
+        obsolete_path = os.path.join(self.destination_path, "obsolete")
+        os.makedirs(os.path.join(kept_path, "nested"))
+        os.makedirs(os.path.join(obsolete_path, "nested"))
+        Path(os.path.join(kept_path, "obsolete.txt")).touch()
+        os.symlink(kept_path, os.path.join(self.destination_path, "link"))
+        files = {kept_path, os.path.join(kept_path, "nested")}
+        with patch.object(
+            sync_drive.os, "scandir", wraps=sync_drive.os.scandir
+        ) as mocked_scandir:
+            with self.assertLogs(logger=LOGGER, level="INFO") as captured:
+                actual = sync_drive.remove_obsolete(
+                    destination_path=self.destination_path, files=files
+                )
+        self.assertSetEqual(
+            {
+                obsolete_path,
+                os.path.join(kept_path, "obsolete.txt"),
+                os.path.join(self.destination_path, "link"),
+            },
+            actual,
+        )
+        self.assertSetEqual(
+            {self.destination_path, kept_path, os.path.join(kept_path, "nested")},
+            # rmtree scans the removed folders by file descriptor
+            {
+                call.args[0]
+                for call in mocked_scandir.call_args_list
+                if isinstance(call.args[0], str)
+            },
+        )
+        self.assertTrue(os.path.isdir(kept_path))
+        self.assertIn("Removed 3 obsolete paths in", captured.records[-1].getMessage())
+
+    def test_remove_obsolete_vanished_file(self):
+        """Test for a file removed while cleaning up."""
+        obsolete_file_path = os.path.join(self.destination_path, "obsolete.txt")
+        Path(obsolete_file_path).touch()
+        with patch.object(sync_drive.os, "unlink") as mocked_unlink:
+            mocked_unlink.side_effect = FileNotFoundError()
+            actual = sync_drive.remove_obsolete(
+                destination_path=self.destination_path, files=set()
+            )
+        self.assertSetEqual({obsolete_file_path}, actual)
+
     def test_remove_obsolete_none_destination_path(self):
         """Test for destination path as None."""
         self.assertTrue(
@@ -941,7 +1214,7 @@ class TestSyncDrive(unittest.TestCase):
             filters=self.filters,
             remove=False,
         )
-        self.assertTrue(len(actual) == 11)
+        self.assertTrue(len(actual) == 33)
         self.assertTrue(os.path.isdir(os.path.join(self.destination_path, "icloudpy")))
         self.assertTrue(
             os.path.isdir(os.path.join(self.destination_path, "icloudpy", "Test"))
@@ -977,7 +1250,7 @@ class TestSyncDrive(unittest.TestCase):
             ignore=self.ignore,
             remove=True,
         )
-        self.assertTrue(len(actual) == 11)
+        self.assertTrue(len(actual) == 33)
         self.assertTrue(os.path.isdir(os.path.join(self.destination_path, "icloudpy")))
         self.assertTrue(
             os.path.isdir(os.path.join(self.destination_path, "icloudpy", "Test"))
@@ -996,6 +1269,19 @@ class TestSyncDrive(unittest.TestCase):
                 )
             )
         )
+        # Package members are kept by remove_obsolete
+        self.assertTrue(
+            os.path.isfile(
+                os.path.join(
+                    self.destination_path,
+                    "Obsidian",
+                    "Sample",
+                    "ms.band",
+                    "Resources",
+                    "ProjectInformation.plist",
+                )
+            )
+        )
 
     def test_sync_directory_without_folder_filter(self):
         """Test for no folder filter."""
@@ -1011,7 +1297,7 @@ class TestSyncDrive(unittest.TestCase):
             ignore=self.ignore,
             remove=False,
         )
-        self.assertTrue(len(actual) == 15)
+        self.assertTrue(len(actual) == 37)
         self.assertTrue(os.path.isdir(os.path.join(self.destination_path, "icloudpy")))
         self.assertTrue(
             os.path.isdir(os.path.join(self.destination_path, "icloudpy", "Test"))
@@ -1106,6 +1392,914 @@ class TestSyncDrive(unittest.TestCase):
             )
         )
 
+    def test_sync_directory_single_download_worker(self):
+        """Test for sequential downloads with a single worker."""
+        actual = sync_drive.sync_directory(
+            drive=self.drive,
+            destination_path=self.destination_path,
+            root=self.root,
+            items=self.drive.dir(),
+            top=True,
+            filters=self.filters,
+            ignore=self.ignore,
+            remove=False,
+            max_concurrent_downloads=1,
+        )
+        self.assertTrue(len(actual) == 33)
+        self.assertTrue(
+            os.path.isfile(
+                os.path.join(
+                    self.destination_path, "icloudpy", "Test", "Scanned document 1.pdf"
+                )
+            )
+        )
+
+    def test_list_folders(self):
+        """Test for listing a level of folders concurrently."""
+        with ThreadPoolExecutor(max_workers=2) as listing_executor:
+            actual = sync_drive.list_folders(
+                folders=[
+                    (
+                        self.drive[self.items[4]],
+                        os.path.join(self.destination_path, "icloudpy"),
+                    )
+                ],
+                listing_executor=listing_executor,
+            )
+        self.assertEqual(1, len(actual))
+        self.assertEqual("icloudpy", actual[0][0].name)
+        self.assertListEqual(["Test"], actual[0][2])
+
+    def test_list_folders_error(self):
+        """Test for skipping folders which could not be listed."""
+        with patch.object(self.folder_item, "dir") as mocked_folder_method:
+            mocked_folder_method.side_effect = ICloudPyAPIResponseException(
+                "Exception occurred."
+            )
+            with ThreadPoolExecutor(max_workers=2) as listing_executor:
+                with self.assertLogs(logger=LOGGER, level="ERROR") as captured:
+                    actual = sync_drive.list_folders(
+                        folders=[(self.folder_item, self.destination_path)],
+                        listing_executor=listing_executor,
+                    )
+                    self.assertIn("Failed to list", captured.records[0].getMessage())
+        self.assertListEqual([], actual)
+
+    def test_retrieve_folders(self):
+        """Test for retrieving many folders with a single request."""
+        drive = data.ICloudPyServiceMock(
+            data.AUTHENTICATED_USER, data.VALID_PASSWORD
+        ).drive
+        folders = [drive[self.items[4]], drive[self.items[5]]]
+        with patch.object(
+            drive.session, "post", wraps=drive.session.post
+        ) as mocked_post:
+            self.assertEqual(2, sync_drive.retrieve_folders(folders=folders))
+            self.assertEqual(1, mocked_post.call_count)
+        self.assertIn("items", folders[0].data)
+        self.assertIn("items", folders[1].data)
+        self.assertListEqual(["Test"], folders[0].dir())
+
+    def test_retrieve_folders_error(self):
+        """Test for failed folders retrieval."""
+        with patch.object(self.drive.session, "post") as mocked_post:
+            mocked_post.return_value = data.ResponseMock({}, status_code=503)
+            with self.assertRaises(ICloudPyAPIResponseException):
+                sync_drive.retrieve_folders(folders=[self.drive[self.items[4]]])
+
+    def test_list_folders_batches(self):
+        """Test for listing folders in batches."""
+        drive = data.ICloudPyServiceMock(
+            data.AUTHENTICATED_USER, data.VALID_PASSWORD
+        ).drive
+        folders = [
+            (drive[self.items[4]], os.path.join(self.destination_path, "icloudpy")),
+            (drive[self.items[5]], os.path.join(self.destination_path, "unwanted")),
+        ]
+        with patch.object(
+            sync_drive, "retrieve_folders", wraps=sync_drive.retrieve_folders
+        ) as mocked_retrieve_folders:
+            with ThreadPoolExecutor(max_workers=2) as listing_executor:
+                actual = sync_drive.list_folders(
+                    folders=folders, listing_executor=listing_executor, batch_size=1
+                )
+            self.assertEqual(2, mocked_retrieve_folders.call_count)
+        self.assertListEqual(["Test"], actual[0][2])
+        self.assertListEqual([], actual[1][2])
+
+    def test_list_folders_batch_error(self):
+        """Test for falling back to individual listings on batch failure."""
+        drive = data.ICloudPyServiceMock(
+            data.AUTHENTICATED_USER, data.VALID_PASSWORD
+        ).drive
+        folders = [
+            (drive[self.items[4]], os.path.join(self.destination_path, "icloudpy"))
+        ]
+        with patch.object(sync_drive, "retrieve_folders") as mocked_retrieve_folders:
+            mocked_retrieve_folders.side_effect = ICloudPyAPIResponseException(
+                "Exception occurred."
+            )
+            with ThreadPoolExecutor(max_workers=2) as listing_executor:
+                with self.assertLogs(logger=LOGGER, level="WARNING") as captured:
+                    actual = sync_drive.list_folders(
+                        folders=folders, listing_executor=listing_executor
+                    )
+                    self.assertIn(
+                        "Failed to retrieve folders in batch",
+                        captured.records[0].getMessage(),
+                    )
+        self.assertListEqual(["Test"], actual[0][2])
+
+    def test_is_package_from_metadata(self):
+        """Test for package detection without network requests."""
+        with patch.object(self.package_item, "open") as mocked_package_method:
+            self.assertTrue(sync_drive.is_package(item=self.package_item))
+            self.assertFalse(sync_drive.is_package(item=self.file_item))
+            self.assertFalse(
+                sync_drive.is_package(item=self.special_chars_package_item)
+            )
+            mocked_package_method.assert_not_called()
+
+    def test_is_package_recorded(self):
+        """Test for recorded package classification taking precedence."""
+        self.assertFalse(
+            sync_drive.is_package(item=self.package_item, entry={"is_package": 0})
+        )
+        self.assertTrue(
+            sync_drive.is_package(
+                item=self.special_chars_package_item, entry={"is_package": 1}
+            )
+        )
+
+    def test_is_package_existing_local_package(self):
+        """Test for unknown item classified from the local package directory."""
+        local_package_path = os.path.join(
+            self.destination_path, self.special_chars_package_item.name
+        )
+        self.assertFalse(
+            sync_drive.is_package(
+                item=self.special_chars_package_item, local_file=local_package_path
+            )
+        )
+        os.makedirs(local_package_path)
+        self.assertTrue(
+            sync_drive.is_package(
+                item=self.special_chars_package_item, local_file=local_package_path
+            )
+        )
+
+    def test_process_file_records_manifest(self):
+        """Test for recording processed items in the manifest."""
+        files = set()
+        drive_manifest = Manifest(
+            file_path=os.path.join(tests.TEMP_DIR, MANIFEST_FILE_NAME)
+        )
+        self.addCleanup(drive_manifest.close)
+        self.assertTrue(
+            sync_drive.process_file(
+                item=self.special_chars_package_item,
+                destination_path=self.destination_path,
+                filters=self.filters["file_extensions"],
+                ignore=None,
+                files=files,
+                manifest=drive_manifest,
+            )
+        )
+        entry = drive_manifest.get_drive_item(
+            self.special_chars_package_item.data["drivewsid"]
+        )
+        self.assertEqual(1, entry["is_package"])
+        for item in [self.file_item, self.package_item]:
+            self.assertTrue(
+                sync_drive.process_file(
+                    item=item,
+                    destination_path=self.destination_path,
+                    filters=self.filters["file_extensions"],
+                    ignore=None,
+                    files=files,
+                    manifest=drive_manifest,
+                )
+            )
+        entry = drive_manifest.get_drive_item(self.file_item.data["drivewsid"])
+        self.assertEqual(0, entry["is_package"])
+        self.assertEqual(self.file_item.data["etag"], entry["etag"])
+        self.assertEqual(self.file_item.size, entry["size"])
+        self.assertEqual(self.local_file_path, entry["local_path"])
+        # Unchanged items are skipped using the manifest, without network requests
+        with patch.object(
+            self.package_item, "open"
+        ) as mocked_package_method, patch.object(
+            self.file_item, "open"
+        ) as mocked_file_method, patch.object(
+            sync_drive, "file_exists"
+        ) as mocked_file_exists, patch.object(
+            sync_drive, "package_exists"
+        ) as mocked_package_exists:
+            for item in [self.package_item, self.file_item]:
+                self.assertFalse(
+                    sync_drive.process_file(
+                        item=item,
+                        destination_path=self.destination_path,
+                        filters=self.filters["file_extensions"],
+                        ignore=None,
+                        files=files,
+                        manifest=drive_manifest,
+                    )
+                )
+            mocked_package_method.assert_not_called()
+            mocked_file_method.assert_not_called()
+            mocked_file_exists.assert_not_called()
+            mocked_package_exists.assert_not_called()
+        self.assertIn(os.path.join(self.local_package_path, "projectData"), files)
+
+    def test_process_file_manifest_fallback(self):
+        """Test for falling back to local checks when manifest is out of date."""
+        files = set()
+        drive_manifest = Manifest(
+            file_path=os.path.join(tests.TEMP_DIR, MANIFEST_FILE_NAME)
+        )
+        self.addCleanup(drive_manifest.close)
+        # Existing files are recorded on first sight
+        for item, local_path in [
+            (self.file_item, self.local_file_path),
+            (self.package_item, self.local_package_path),
+        ]:
+            sync_drive.download_file(item=item, local_file=local_path)
+            self.assertFalse(
+                sync_drive.process_file(
+                    item=item,
+                    destination_path=self.destination_path,
+                    filters=self.filters["file_extensions"],
+                    ignore=None,
+                    files=files,
+                    manifest=drive_manifest,
+                )
+            )
+            self.assertIsNotNone(drive_manifest.get_drive_item(item.data["drivewsid"]))
+        # Locally modified file
+        shutil.copyfile(
+            os.path.join(tests.DATA_DIR, "thumb.jpeg"), self.local_file_path
+        )
+        self.assertTrue(
+            sync_drive.process_file(
+                item=self.file_item,
+                destination_path=self.destination_path,
+                filters=self.filters["file_extensions"],
+                ignore=None,
+                files=files,
+                manifest=drive_manifest,
+            )
+        )
+        # Locally removed file
+        os.remove(self.local_file_path)
+        self.assertTrue(
+            sync_drive.process_file(
+                item=self.file_item,
+                destination_path=self.destination_path,
+                filters=self.filters["file_extensions"],
+                ignore=None,
+                files=files,
+                manifest=drive_manifest,
+            )
+        )
+
+    def test_manifest_unchanged(self):
+        """Test for manifest up-to-date check."""
+        sync_drive.download_file(item=self.file_item, local_file=self.local_file_path)
+        entry = {
+            "etag": self.file_item.data["etag"],
+            "size": self.file_item.size,
+            "modified": sync_drive.modified_time(self.file_item),
+            "local_path": self.local_file_path,
+            "is_package": 0,
+        }
+        self.assertTrue(
+            sync_drive.manifest_unchanged(
+                item=self.file_item, entry=entry, local_file=self.local_file_path
+            )
+        )
+        self.assertFalse(
+            sync_drive.manifest_unchanged(
+                item=self.file_item, entry=None, local_file=self.local_file_path
+            )
+        )
+        self.assertFalse(
+            sync_drive.manifest_unchanged(
+                item=self.file_item,
+                entry=dict(entry, etag="changed"),
+                local_file=self.local_file_path,
+            )
+        )
+        self.assertFalse(
+            sync_drive.manifest_unchanged(
+                item=self.file_item,
+                entry=dict(entry, local_path=self.local_package_path),
+                local_file=self.local_file_path,
+            )
+        )
+
+    def test_download_worker(self):
+        """Test for files added to the shared collector by download worker."""
+        files = {"existing"}
+        actual = sync_drive.download_worker(
+            item=self.file_item,
+            destination_path=self.destination_path,
+            filters=self.filters["file_extensions"],
+            ignore=None,
+            files=files,
+        )
+        self.assertTrue(actual)
+        self.assertSetEqual({"existing", self.local_file_path}, files)
+        self.assertTrue(os.path.isfile(self.local_file_path))
+
+    def test_download_worker_error_isolation(self):
+        """Test for download worker logging errors instead of raising."""
+        files = set()
+        with patch.object(sync_drive, "file_exists") as mocked_file_exists:
+            mocked_file_exists.side_effect = OSError("Exception occurred.")
+            with self.assertLogs(logger=LOGGER, level="ERROR") as captured:
+                actual = sync_drive.download_worker(
+                    item=self.file_item,
+                    destination_path=self.destination_path,
+                    filters=self.filters["file_extensions"],
+                    ignore=None,
+                    files=files,
+                )
+                self.assertIn("Failed to process", captured.records[0].getMessage())
+        self.assertFalse(actual)
+        self.assertSetEqual({self.local_file_path}, files)
+
+    def test_download_worker_manifest(self):
+        """Test for download worker reporting recorded files as synced."""
+        manifest = Manifest(file_path=os.path.join(tests.TEMP_DIR, MANIFEST_FILE_NAME))
+        kwargs = {
+            "item": self.file_item,
+            "destination_path": self.destination_path,
+            "filters": self.filters["file_extensions"],
+            "ignore": None,
+            "manifest": manifest,
+        }
+        self.assertTrue(sync_drive.download_worker(files=set(), **kwargs))
+        with patch.object(manifest, "put_drive_item"):
+            os.remove(self.local_file_path)
+            self.assertTrue(sync_drive.download_worker(files=set(), **kwargs))
+        manifest.put_drive_item(
+            **{**manifest.get_drive_item(self.file_item.data["drivewsid"]), "etag": "0"}
+        )
+        with patch.object(manifest, "put_drive_item"):
+            self.assertFalse(sync_drive.download_worker(files=set(), **kwargs))
+        # Unwanted files have nothing to sync
+        self.assertTrue(
+            sync_drive.download_worker(
+                files=set(), **{**kwargs, "filters": ["unwanted-extension"]}
+            )
+        )
+        manifest.close()
+
+    def test_record_folders(self):
+        """Test for recording only the folders without failures in their subtree."""
+        manifest = Manifest(file_path=os.path.join(tests.TEMP_DIR, MANIFEST_FILE_NAME))
+        clean_folder = os.path.join(self.destination_path, "icloudpy")
+        dirty_folder = os.path.join(self.destination_path, "Obsidian")
+        folders = [
+            (self.drive[self.items[4]], clean_folder),
+            (self.drive[self.items[6]], dirty_folder),
+        ]
+        self.assertEqual(
+            1,
+            sync_drive.record_folders(
+                folders=folders,
+                failed={os.path.join(dirty_folder, "Sample")},
+                manifest=manifest,
+            ),
+        )
+        self.assertEqual(
+            {
+                "type": "folder",
+                "etag": self.drive[self.items[4]].data["etag"],
+                "local_path": clean_folder,
+            },
+            {
+                key: value
+                for key, value in manifest.get_drive_item(
+                    self.drive[self.items[4]].data["drivewsid"]
+                ).items()
+                if key in ("type", "etag", "local_path")
+            },
+        )
+        self.assertIsNone(
+            manifest.get_drive_item(self.drive[self.items[6]].data["drivewsid"])
+        )
+        self.assertFalse(
+            sync_drive.folder_unchanged(
+                item=self.drive[self.items[6]],
+                local_folder=dirty_folder,
+                manifest=manifest,
+            )
+        )
+        self.assertTrue(
+            sync_drive.folder_unchanged(
+                item=self.drive[self.items[4]],
+                local_folder=clean_folder,
+                manifest=manifest,
+            )
+        )
+        manifest.close()
+
+    def test_sync_drive_prunes_unchanged_folders(self):
+        """Test for skipping the listing of unchanged folders."""
+        config = self.config.copy()
+        config["drive"]["destination"] = self.destination_path
+        config["drive"]["remove_obsolete"] = True
+        expected = sync_drive.sync_drive(config=config, drive=self.drive)
+        drive = data.ICloudPyServiceMock(
+            data.AUTHENTICATED_USER, data.VALID_PASSWORD
+        ).drive
+        with patch.object(sync_drive, "retrieve_folders") as mocked_retrieve:
+            with patch.object(sync_drive, "download_file") as mocked_download:
+                actual = sync_drive.sync_drive(config=config, drive=drive)
+                mocked_download.assert_not_called()
+            mocked_retrieve.assert_not_called()
+        self.assertEqual(len(expected), len(actual))
+        for path in Path(self.destination_path).rglob("*"):
+            self.assertIn(str(path), actual)
+        self.assertTrue(
+            os.path.isfile(
+                os.path.join(
+                    self.destination_path, "icloudpy", "Test", "Document scanne 2.pdf"
+                )
+            )
+        )
+
+    def test_sync_drive_changed_filters_disable_pruning(self):
+        """Test for walking the full tree after filters change."""
+        config = self.config.copy()
+        config["drive"]["destination"] = self.destination_path
+        sync_drive.sync_drive(config=config, drive=self.drive)
+        config["drive"]["ignore"] = config["drive"]["ignore"] + ["*.xyz"]
+        drive = data.ICloudPyServiceMock(
+            data.AUTHENTICATED_USER, data.VALID_PASSWORD
+        ).drive
+        with patch.object(
+            sync_drive, "retrieve_folders", wraps=sync_drive.retrieve_folders
+        ) as mocked_retrieve:
+            sync_drive.sync_drive(config=config, drive=drive)
+            mocked_retrieve.assert_called()
+
+    def test_recorded_files(self):
+        """Test for recorded files below an unchanged folder."""
+        manifest = Manifest(file_path=os.path.join(tests.TEMP_DIR, MANIFEST_FILE_NAME))
+        package_member = os.path.join(self.local_package_path, "Output", "1.wav")
+        os.makedirs(os.path.dirname(package_member))
+        Path(package_member).touch()
+        manifest.put_drive_item(
+            drivewsid="FILE::package",
+            type="file",
+            local_path=self.local_package_path,
+            is_package=1,
+        )
+        manifest.put_drive_item(
+            drivewsid="FILE::file",
+            type="file",
+            local_path=self.local_file_path,
+            is_package=0,
+        )
+        self.assertSetEqual(
+            {
+                self.local_package_path,
+                os.path.dirname(package_member),
+                package_member,
+                self.local_file_path,
+            },
+            sync_drive.recorded_files(
+                local_folder=self.destination_path, manifest=manifest, files=set()
+            ),
+        )
+        manifest.close()
+
+    def test_sync_directory_failure_keeps_folders_dirty(self):
+        """Test for not recording folders with failed downloads."""
+        manifest = Manifest(file_path=os.path.join(tests.TEMP_DIR, MANIFEST_FILE_NAME))
+        with patch.object(sync_drive, "download_file") as mocked_download:
+            mocked_download.side_effect = Exception("Exception occurred.")
+            sync_drive.sync_directory(
+                drive=self.drive,
+                destination_path=self.destination_path,
+                root=self.root,
+                items=self.drive.dir(),
+                top=True,
+                filters=self.filters,
+                ignore=self.ignore,
+                manifest=manifest,
+            )
+        self.assertIsNone(
+            manifest.get_drive_item(self.drive[self.items[4]].data["drivewsid"])
+        )
+        manifest.close()
+
+    def test_sync_directory_pending_downloads(self):
+        """Test for bounding the downloads queued during the walk."""
+        left = []
+        finish_downloads = sync_drive.finish_downloads
+
+        def finish(futures, failed=None, pending=0):
+            finish_downloads(futures, failed=failed, pending=pending)
+            left.append(len(futures))
+
+        failed = set()
+        manifest = Manifest(file_path=os.path.join(tests.TEMP_DIR, MANIFEST_FILE_NAME))
+        with patch.object(sync_drive, "MAX_PENDING_DOWNLOADS", 1), patch.object(
+            sync_drive, "finish_downloads", side_effect=finish
+        ), patch.object(sync_drive, "download_file", side_effect=Exception("failed")):
+            files = sync_drive.sync_directory(
+                drive=self.drive,
+                destination_path=self.destination_path,
+                root=self.root,
+                items=self.drive.dir(),
+                top=True,
+                filters=self.filters,
+                ignore=self.ignore,
+                manifest=manifest,
+                failed=failed,
+            )
+        manifest.close()
+        self.assertTrue(len(left) > 1)
+        self.assertLessEqual(max(left), 1)
+        # Results of downloads finished during the walk are kept
+        self.assertSetEqual(
+            {
+                os.path.join(self.destination_path, "icloudpy", "Test"),
+                os.path.join(self.destination_path, "Obsidian", "Sample"),
+            },
+            failed,
+        )
+        self.assertTrue(len(files) > 0)
+
+    def test_drive_changed(self):
+        """Test for detecting drive changes from the root metadata."""
+        config = self.config.copy()
+        config["drive"]["destination"] = self.destination_path
+        self.assertTrue(sync_drive.drive_changed(config=config, drive=self.drive))
+        sync_drive.sync_drive(config=config, drive=self.drive)
+        drive = data.ICloudPyServiceMock(
+            data.AUTHENTICATED_USER, data.VALID_PASSWORD
+        ).drive
+        self.assertFalse(sync_drive.drive_changed(config=config, drive=drive))
+        drive.root.data["items"][4]["etag"] = "changed"
+        self.assertTrue(sync_drive.drive_changed(config=config, drive=drive))
+        config["drive"]["ignore"] = config["drive"]["ignore"] + ["*.xyz"]
+        self.assertTrue(sync_drive.drive_changed(config=config, drive=self.drive))
+
+    def test_drive_changed_after_failed_sync(self):
+        """Test for not short-circuiting after a sync with failures."""
+        config = self.config.copy()
+        config["drive"]["destination"] = self.destination_path
+        with patch.object(sync_drive, "download_file") as mocked_download:
+            mocked_download.side_effect = Exception("Exception occurred.")
+            sync_drive.sync_drive(config=config, drive=self.drive)
+        self.assertTrue(sync_drive.drive_changed(config=config, drive=self.drive))
+
+    def test_drive_filter(self):
+        """Test for compiled drive filter."""
+        drive_filter = sync_drive.DriveFilter(
+            filters=self.filters, ignore=self.ignore, root=self.root
+        )
+        self.assertTrue(
+            drive_filter.wanted_file(os.path.join(self.root, "dir1", "file.PDF"))
+        )
+        self.assertFalse(
+            drive_filter.wanted_file(os.path.join(self.root, "dir1", "file.exe"))
+        )
+        self.assertFalse(
+            drive_filter.wanted_file(os.path.join(self.root, "dir1", "file.psd"))
+        )
+        self.assertFalse(drive_filter.wanted_file(None))
+        self.assertTrue(
+            drive_filter.wanted_folder(os.path.join(self.root, "dir1", "dir2"))
+        )
+        self.assertFalse(drive_filter.wanted_folder(os.path.join(self.root, "dir3")))
+        self.assertTrue(
+            drive_filter.wanted_parent_folder(
+                os.path.join(self.root, "dir1", "dir2", "dir3", "dir4")
+            )
+        )
+        self.assertFalse(
+            drive_filter.wanted_parent_folder(os.path.join(self.root, "dir1"))
+        )
+        unfiltered = sync_drive.DriveFilter()
+        self.assertTrue(unfiltered.wanted_file(os.path.join(self.root, "file.exe")))
+        self.assertTrue(unfiltered.wanted_folder(os.path.join(self.root, "dir3")))
+        self.assertTrue(
+            unfiltered.wanted_parent_folder(os.path.join(self.root, "dir3"))
+        )
+
+    def test_drive_filter_folder_trie(self):
+        """Test for folder lookups in the filter folder trie."""
+        drive_filter = sync_drive.DriveFilter(
+            filters={"folders": ["/dir1/dir2/", "dir1/dir2/dir3", "./dir4"]},
+            root=self.root,
+        )
+        self.assertEqual((True, False), drive_filter.match_folder(self.root))
+        self.assertEqual(
+            (True, False), drive_filter.match_folder(os.path.join(self.root, "dir1"))
+        )
+        self.assertEqual(
+            (True, True),
+            drive_filter.match_folder(os.path.join(self.root, "dir1", "dir2")),
+        )
+        self.assertEqual(
+            (True, True),
+            drive_filter.match_folder(os.path.join(self.root, "dir4", "a", "b")),
+        )
+        self.assertEqual(
+            (False, False),
+            drive_filter.match_folder(os.path.join(self.root, "dir1", "dir3")),
+        )
+        self.assertEqual(
+            (False, False), drive_filter.match_folder(os.path.dirname(self.root))
+        )
+        self.assertEqual((False, False), drive_filter.match_folder(self.root + "1"))
+
+    def test_sync_directory_prunes_unwanted_folders(self):
+        """Test for unwanted folders never being listed."""
+        listed = []
+
+        def list_folders(folders, **kwargs):
+            listed.extend(item.name for item, _ in folders)
+            return original_list_folders(folders=folders, **kwargs)
+
+        original_list_folders = sync_drive.list_folders
+        with patch.object(sync_drive, "list_folders", side_effect=list_folders):
+            sync_drive.sync_directory(
+                drive=self.drive,
+                destination_path=self.destination_path,
+                root=self.root,
+                items=self.drive.dir(),
+                top=True,
+                filters={"folders": ["icloudpy"]},
+                ignore=self.ignore,
+            )
+        self.assertIn("icloudpy", listed)
+        self.assertNotIn("unwanted", listed)
+        self.assertNotIn("Obsidian", listed)
+
+    def test_drive_filter_compiled_once(self):
+        """Test for ignore patterns compiled once per sync."""
+        with patch.object(
+            sync_drive.PathSpec, "from_lines", wraps=sync_drive.PathSpec.from_lines
+        ) as mocked_from_lines:
+            sync_drive.sync_directory(
+                drive=self.drive,
+                destination_path=self.destination_path,
+                root=self.root,
+                items=self.drive.dir(),
+                top=True,
+                filters=self.filters,
+                ignore=self.ignore,
+            )
+            self.assertEqual(1, mocked_from_lines.call_count)
+
+    def test_sync_drive_moves_renamed_items(self):
+        """Test for moving local copies of moved items instead of downloading."""
+        config = self.config.copy()
+        config["drive"]["destination"] = self.destination_path
+        config["drive"]["remove_obsolete"] = True
+        sync_drive.sync_drive(config=config, drive=self.drive)
+        folder_path = os.path.join(self.destination_path, "icloudpy")
+        previous_folder_path = os.path.join(self.destination_path, "previous")
+        file_path = os.path.join(folder_path, "Test", "Scanned document 1.pdf")
+        previous_file_path = os.path.join(folder_path, "Test", "previous.pdf")
+        # Simulate the previous sync having stored the items elsewhere
+        manifest = Manifest(file_path=os.path.join(tests.TEMP_DIR, MANIFEST_FILE_NAME))
+        os.rename(file_path, previous_file_path)
+        manifest.move_drive_items(
+            previous_path=file_path, local_path=previous_file_path
+        )
+        os.rename(folder_path, previous_folder_path)
+        manifest.move_drive_items(
+            previous_path=folder_path, local_path=previous_folder_path
+        )
+        # A renamed file changes the etags of its folders
+        for folder in (self.drive[self.items[4]], self.drive[self.items[4]]["Test"]):
+            manifest.put_drive_item(
+                **{
+                    **manifest.get_drive_item(folder.data["drivewsid"]),
+                    "etag": "changed",
+                }
+            )
+        manifest.close()
+        drive = data.ICloudPyServiceMock(
+            data.AUTHENTICATED_USER, data.VALID_PASSWORD
+        ).drive
+        with patch.object(sync_drive, "download_file") as mocked_download:
+            with self.assertLogs(logger=LOGGER, level="INFO") as captured:
+                sync_drive.sync_drive(config=config, drive=drive)
+            mocked_download.assert_not_called()
+        messages = [record.getMessage() for record in captured.records]
+        self.assertIn(f"Moving {previous_folder_path} to {folder_path} ...", messages)
+        self.assertIn(
+            f"Moving {previous_file_path.replace(previous_folder_path, folder_path)}"
+            + f" to {file_path} ...",
+            messages,
+        )
+        self.assertTrue(os.path.isfile(file_path))
+        self.assertFalse(os.path.exists(previous_folder_path))
+
+    def test_sync_drive_moves_before_syncing_the_level(self):
+        """Test for syncing a new item at the path its moved sibling vacated."""
+        config = self.config.copy()
+        config["drive"]["destination"] = self.destination_path
+        sync_drive.sync_drive(config=config, drive=self.drive)
+        folder = self.drive[self.items[4]]["Test"]
+        folder_path = os.path.join(self.destination_path, "icloudpy", "Test")
+        new_path = os.path.join(folder_path, "Document scanne 2.pdf")
+        moved_path = os.path.join(folder_path, "Scanned document 1.pdf")
+        # The moved file was stored at the path of the new one
+        manifest = Manifest(file_path=os.path.join(tests.TEMP_DIR, MANIFEST_FILE_NAME))
+        os.remove(moved_path)
+        manifest.put_drive_item(
+            **{
+                **manifest.get_drive_item(
+                    folder["Scanned document 1.pdf"].data["drivewsid"]
+                ),
+                "local_path": new_path,
+            }
+        )
+        for changed in (self.drive[self.items[4]], folder):
+            manifest.put_drive_item(
+                **{
+                    **manifest.get_drive_item(changed.data["drivewsid"]),
+                    "etag": "changed",
+                }
+            )
+        manifest.close()
+        drive = data.ICloudPyServiceMock(
+            data.AUTHENTICATED_USER, data.VALID_PASSWORD
+        ).drive
+        with patch.object(
+            sync_drive, "download_file", wraps=sync_drive.download_file
+        ) as mocked_download:
+            with self.assertLogs(logger=LOGGER, level="INFO") as captured:
+                sync_drive.sync_drive(config=config, drive=drive)
+        messages = [record.getMessage() for record in captured.records]
+        self.assertIn(f"Moving {new_path} to {moved_path} ...", messages)
+        self.assertIn(
+            new_path,
+            [call.kwargs["local_file"] for call in mocked_download.call_args_list],
+        )
+        self.assertTrue(os.path.isfile(new_path))
+        self.assertTrue(os.path.isfile(moved_path))
+
+    def test_sync_drive_dry_run(self):
+        """Test for planning the sync without touching the local copy."""
+        config = self.config.copy()
+        config["drive"]["destination"] = self.destination_path
+        config["drive"]["remove_obsolete"] = True
+        obsolete_path = os.path.join(self.destination_path, "obsolete.txt")
+        Path(obsolete_path).touch()
+        plan = SyncPlan()
+        # A fresh drive still has its folders to list
+        drive = data.ICloudPyServiceMock(
+            data.AUTHENTICATED_USER, data.VALID_PASSWORD
+        ).drive
+        with patch.object(sync_drive, "download_file") as mocked_download, patch.object(
+            drive.session, "request", wraps=drive.session.request
+        ) as mocked_request:
+            sync_drive.sync_drive(config=config, drive=drive, plan=plan)
+            mocked_download.assert_not_called()
+        summary = plan.summary()
+        self.assertGreater(summary["downloads"], 0)
+        self.assertGreater(summary["download_bytes"], 0)
+        # Every listing request is counted, besides the downloads
+        self.assertEqual(
+            mocked_request.call_count,
+            summary["requests"] - sync_drive.DOWNLOAD_REQUESTS * summary["downloads"],
+        )
+        self.assertIn(
+            os.path.join(
+                self.destination_path, "icloudpy", "Test", "Scanned document 1.pdf"
+            ),
+            plan.downloads,
+        )
+        self.assertListEqual([obsolete_path], plan.deletions)
+        self.assertListEqual(["obsolete.txt"], os.listdir(self.destination_path))
+        manifest = Manifest(file_path=os.path.join(tests.TEMP_DIR, MANIFEST_FILE_NAME))
+        self.assertIsNone(manifest.get_meta(sync_drive.DRIVE_STATE_META_KEY))
+        manifest.close()
+
+        # Planning after a sync skips the synced files
+        sync_drive.sync_drive(config=config, drive=self.drive)
+        drive = data.ICloudPyServiceMock(
+            data.AUTHENTICATED_USER, data.VALID_PASSWORD
+        ).drive
+        synced_plan = SyncPlan()
+        sync_drive.sync_drive(config=config, drive=drive, plan=synced_plan)
+        self.assertGreater(synced_plan.skips, 0)
+        self.assertLess(len(synced_plan.downloads), summary["downloads"])
+        self.assertListEqual([], synced_plan.deletions)
+
+    def test_process_file_dry_run_skips_synced_files(self):
+        """Test for planning to skip files which are already synced."""
+        config = self.config.copy()
+        config["drive"]["destination"] = self.destination_path
+        sync_drive.sync_drive(config=config, drive=self.drive)
+        manifest = Manifest(
+            file_path=os.path.join(tests.TEMP_DIR, MANIFEST_FILE_NAME), read_only=True
+        )
+        plan = SyncPlan()
+        for item, folder, item_manifest in (
+            (self.file_item, os.path.join("icloudpy", "Test"), manifest),
+            (self.file_item, os.path.join("icloudpy", "Test"), None),
+            (self.package_item, os.path.join("Obsidian", "Sample"), None),
+        ):
+            self.assertFalse(
+                sync_drive.process_file(
+                    item=item,
+                    destination_path=os.path.join(self.destination_path, folder),
+                    filters=self.filters["file_extensions"],
+                    ignore=self.ignore,
+                    files=set(),
+                    manifest=item_manifest,
+                    plan=plan,
+                )
+            )
+        manifest.close()
+        self.assertEqual(3, plan.skips)
+        self.assertListEqual([], plan.downloads)
+
+    def test_package_exists_keeps_changed_package(self):
+        """Test for keeping a changed package when only checking it."""
+        os.makedirs(self.local_package_path)
+        Path(self.local_package_path, "member").touch()
+        self.assertFalse(
+            sync_drive.package_exists(
+                item=self.package_item,
+                local_package_path=self.local_package_path,
+                remove_changed=False,
+            )
+        )
+        self.assertTrue(os.path.isdir(self.local_package_path))
+
+    def test_move_recorded_item_skipped(self):
+        """Test for not moving items which cannot be moved safely."""
+        manifest = Manifest(file_path=os.path.join(tests.TEMP_DIR, MANIFEST_FILE_NAME))
+        previous_path = os.path.join(self.destination_path, "previous.pdf")
+        Path(previous_path).touch()
+        item = self.file_item
+        kwargs = {"item": item, "root": self.root, "manifest": manifest}
+        self.assertFalse(
+            sync_drive.move_recorded_item(local_path=self.local_file_path, **kwargs)
+        )
+        manifest.put_drive_item(
+            drivewsid=item.data["drivewsid"],
+            type="file",
+            local_path=previous_path,
+            is_package=0,
+        )
+        # Outside of the root
+        self.assertFalse(
+            sync_drive.move_recorded_item(
+                local_path=self.local_file_path, **{**kwargs, "root": DATA_DIR}
+            )
+        )
+        # Existing target
+        Path(self.local_file_path).touch()
+        self.assertFalse(
+            sync_drive.move_recorded_item(local_path=self.local_file_path, **kwargs)
+        )
+        os.remove(self.local_file_path)
+        with patch.object(sync_drive.os, "rename") as mocked_rename:
+            mocked_rename.side_effect = OSError("Exception occurred.")
+            with self.assertLogs(logger=LOGGER, level="WARNING") as captured:
+                self.assertFalse(
+                    sync_drive.move_recorded_item(
+                        local_path=self.local_file_path, **kwargs
+                    )
+                )
+            self.assertIn("Failed to move", captured.records[0].getMessage())
+        self.assertTrue(
+            sync_drive.move_recorded_item(local_path=self.local_file_path, **kwargs)
+        )
+        self.assertTrue(os.path.isfile(self.local_file_path))
+        self.assertFalse(
+            sync_drive.move_recorded_item(local_path=self.local_file_path, **kwargs)
+        )
+        manifest.close()
+
+    def test_list_folders_records_failures(self):
+        """Test for list failures marking the folder as failed."""
+        item = self.drive[self.items[4]]
+        failed = set()
+        with patch.object(item, "dir") as mocked_dir:
+            mocked_dir.side_effect = Exception("Exception occurred.")
+            with ThreadPoolExecutor(max_workers=1) as listing_executor:
+                sync_drive.list_folders(
+                    folders=[(item, os.path.join(self.destination_path, "icloudpy"))],
+                    listing_executor=listing_executor,
+                    failed=failed,
+                )
+        self.assertSetEqual({os.path.join(self.destination_path, "icloudpy")}, failed)
+
     @patch(target="keyring.get_password", return_value=data.VALID_PASSWORD)
     @patch(
         target="src.config_parser.get_username", return_value=data.AUTHENTICATED_USER
@@ -1244,12 +2438,129 @@ class TestSyncDrive(unittest.TestCase):
             ),
         )
 
-    def test_process_package_invalid_package_type(self):
-        """Test for invalid package type."""
-        self.assertFalse(
-            sync_drive.process_package(local_file=os.path.join(DATA_DIR, "medium.jpeg"))
+    def test_unpack_package_spooled_to_disk(self):
+        """Test for unpacking a package larger than the in-memory spool."""
+        local_package_path = os.path.join(
+            self.destination_path, self.package_name_nested
+        )
+        with open(local_package_path, "wb") as f:
+            f.write(b"previous flat file")
+        with open(os.path.join(DATA_DIR, "ms.band.zip"), "rb") as archive:
+            with patch.object(sync_drive, "PACKAGE_SPOOL_MAX_SIZE", 1):
+                self.assertEqual(
+                    local_package_path,
+                    sync_drive.unpack_package(
+                        chunks=iter(lambda: archive.read(3), b""),
+                        local_file=local_package_path,
+                    ),
+                )
+        self.assertTrue(os.path.isdir(local_package_path))
+
+    def test_download_file_invalid_package(self):
+        """Test for downloading a package which is not an archive."""
+        with patch.object(self.package_item, "open") as mock_open:
+            mock_open.return_value = data.ResponseMock(
+                {}, url="/packageDownload?", raw=io.BytesIO(b"not an archive")
+            )
+            with self.assertLogs(logger=LOGGER, level="ERROR") as captured:
+                self.assertFalse(
+                    sync_drive.download_file(
+                        item=self.package_item, local_file=self.local_package_path
+                    )
+                )
+        self.assertIn("Unhandled file type", captured.records[0].getMessage())
+        self.assertFalse(os.path.exists(self.local_package_path))
+
+    def test_sniff_content_type(self):
+        """Test for sniffing archives from their magic bytes."""
+        with patch.object(sync_drive, "get_magic") as mocked_get_magic:
+            self.assertEqual(
+                "application/zip", sync_drive.sniff_content_type(b"PK\x03\x04data")
+            )
+            self.assertEqual(
+                "application/gzip", sync_drive.sniff_content_type(b"\x1f\x8bdata")
+            )
+            mocked_get_magic.assert_not_called()
+
+    def test_sniff_content_type_libmagic_fallback(self):
+        """Test for reusing one libmagic handle for unknown content."""
+        sync_drive.get_magic.cache_clear()
+        with open(os.path.join(DATA_DIR, "medium.jpeg"), "rb") as f:
+            head = f.read(sync_drive.SNIFF_SIZE)
+        with patch.object(
+            sync_drive.magic, "Magic", wraps=sync_drive.magic.Magic
+        ) as mocked_magic:
+            self.assertEqual("image/jpeg", sync_drive.sniff_content_type(head))
+            self.assertEqual("image/jpeg", sync_drive.sniff_content_type(head))
+            mocked_magic.assert_called_once_with(mime=True)
+        sync_drive.get_magic.cache_clear()
+
+    def test_package_members(self):
+        """Test for package members recorded once and reused."""
+        manifest = Manifest(file_path=os.path.join(tests.TEMP_DIR, MANIFEST_FILE_NAME))
+        shutil.copytree(
+            os.path.join(DATA_DIR, self.package_name_nested),
+            os.path.join(self.destination_path, self.package_name_nested),
+        )
+        local_package_path = os.path.join(
+            self.destination_path, self.package_name_nested
+        )
+        expected = sync_drive.package_members(
+            local_file=local_package_path, manifest=manifest
+        )
+        self.assertIn(
+            os.path.join(local_package_path, "Resources", "ProjectInformation.plist"),
+            expected,
+        )
+        with patch.object(sync_drive.Path, "glob") as mocked_glob:
+            self.assertListEqual(
+                expected,
+                sync_drive.package_members(
+                    local_file=local_package_path, manifest=manifest
+                ),
+            )
+            mocked_glob.assert_not_called()
+        manifest.close()
+
+    def test_extract_zip_parallel(self):
+        """Test for extracting the members of a large zip in parallel."""
+        serial_path = os.path.join(self.destination_path, "serial")
+        parallel_path = os.path.join(self.destination_path, "parallel")
+        archive = os.path.join(DATA_DIR, "Project.band.zip")
+        sync_drive.extract_zip(archive=archive, destination_path=serial_path)
+        with patch.object(sync_drive, "PARALLEL_EXTRACTION_MIN_SIZE", 0):
+            with ThreadPoolExecutor(max_workers=2) as extraction_executor:
+                with patch.object(
+                    extraction_executor, "submit", wraps=extraction_executor.submit
+                ) as mocked_submit:
+                    sync_drive.extract_zip(
+                        archive=archive,
+                        destination_path=parallel_path,
+                        extraction_executor=extraction_executor,
+                    )
+                    self.assertTrue(mocked_submit.call_count > 1)
+        self.assertListEqual(
+            sorted(
+                os.path.relpath(str(f), serial_path)
+                for f in Path(serial_path).glob("**/*")
+            ),
+            sorted(
+                os.path.relpath(str(f), parallel_path)
+                for f in Path(parallel_path).glob("**/*")
+            ),
         )
 
+    def test_unpack_package_invalid_package_type(self):
+        """Test for invalid package type."""
+        with open(os.path.join(DATA_DIR, "medium.jpeg"), "rb") as f:
+            self.assertFalse(
+                sync_drive.unpack_package(
+                    chunks=iter(lambda: f.read(1024), b""),
+                    local_file=self.local_package_path,
+                )
+            )
+        self.assertFalse(os.path.exists(self.local_package_path))
+
     def test_execution_continuation_on_icloudpy_exception(self):
         """Test for icloudpy exception."""
         with patch.object(self.file_item, "open") as mocked_file_method, patch.object(
@@ -1270,7 +2581,7 @@ class TestSyncDrive(unittest.TestCase):
                 ignore=self.ignore,
                 remove=False,
             )
-            self.assertTrue(len(actual) == 12)
+            self.assertTrue(len(actual) == 34)
             self.assertTrue(
                 os.path.isdir(os.path.join(self.destination_path, "icloudpy"))
             )
@@ -1,16 +1,24 @@
 """Tests for sync_photos.py file."""
 __author__ = "Mandar Patil (mandarons@pm.me)"
 
+import copy
 import glob
 import os
 import shutil
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from unittest.mock import patch
 
 import icloudpy
 
 import tests
 from src import LOGGER, read_config, sync_photos
+from src.kept_paths import KeptPaths
+from src.manifest import MANIFEST_FILE_NAME, Manifest
+from src.photo_changes import LibraryChanges
+from src.sync_plan import SyncPlan
 from tests import DATA_DIR, data
 
 
@@ -20,6 +28,7 @@ class TestSyncPhotos(unittest.TestCase):
     def setUp(self) -> None:
         """Initialize tests."""
         self.config = read_config(config_path=tests.CONFIG_PATH)
+        self.config["app"]["root"] = tests.TEMP_DIR
 
         self.root = tests.PHOTOS_DIR
 
@@ -427,6 +436,53 @@ class TestSyncPhotos(unittest.TestCase):
 
         self.assertFalse(os.path.exists(os.path.join(album_1_path, "delete_me.JPG")))
 
+    @patch(target="keyring.get_password", return_value=data.VALID_PASSWORD)
+    @patch(
+        target="src.config_parser.get_username", return_value=data.AUTHENTICATED_USER
+    )
+    @patch("icloudpy.ICloudPyService")
+    @patch("src.read_config")
+    def test_sync_photos_dry_run(
+        self,
+        mock_read_config,
+        mock_service,
+        mock_get_username,
+        mock_get_password,
+    ):
+        """Test for planning the photos sync without downloading anything."""
+        mock_service = self.service
+        config = self.config.copy()
+        config["photos"]["destination"] = self.destination_path
+        config["photos"]["remove_obsolete"] = True
+        config["photos"]["folder_format"] = "%Y/%m"
+        mock_read_config.return_value = config
+        obsolete_path = os.path.join(self.destination_path, "obsolete.JPG")
+        with open(obsolete_path, "w", encoding="utf-8"):
+            pass
+        plan = SyncPlan()
+        photos = mock_service.photos
+        with patch.object(sync_photos, "fetch_photo") as mocked_download, patch.object(
+            mock_service.session, "request", wraps=mock_service.session.request
+        ) as mocked_request:
+            sync_photos.sync_photos(config=config, photos=photos, plan=plan)
+            mocked_download.assert_not_called()
+        self.assertGreater(len(plan.downloads), 0)
+        self.assertGreater(plan.download_bytes, 0)
+        # Every listing and paging request is counted, besides the downloads
+        self.assertEqual(mocked_request.call_count, plan.requests - len(plan.downloads))
+        self.assertListEqual([obsolete_path], plan.deletions)
+        self.assertListEqual(["obsolete.JPG"], os.listdir(self.destination_path))
+
+        # Planning after a sync skips the synced photos
+        sync_photos.sync_photos(config=config, photos=mock_service.photos)
+        synced_plan = SyncPlan()
+        sync_photos.sync_photos(
+            config=config, photos=mock_service.photos, plan=synced_plan
+        )
+        self.assertListEqual([], synced_plan.downloads)
+        self.assertEqual(len(plan.downloads), synced_plan.skips)
+        self.assertListEqual([], synced_plan.deletions)
+
     def test_remove_obsolete_none_destination_path(self):
         """Test for destination path as None."""
         self.assertTrue(
@@ -516,6 +572,552 @@ class TestSyncPhotos(unittest.TestCase):
             sync_photos.download_photo(MockPhoto(), ["original"], self.destination_path)
         )
 
+    def test_sync_album_sequential_download(self):
+        """Test for downloading the photos of an album without an executor."""
+        album = self.service.photos.libraries["PrimarySync"].albums["album-1"]
+        with self.assertLogs(logger=LOGGER, level="INFO") as captured:
+            self.assertTrue(
+                sync_photos.sync_album(
+                    album=album,
+                    destination_path=self.destination_path,
+                    file_sizes=["original"],
+                )
+            )
+        downloaded = [
+            record.getMessage()
+            for record in captured.records
+            if record.getMessage().startswith("Downloading ")
+        ]
+        self.assertGreater(len(downloaded), 0)
+        self.assertEqual(len(downloaded), len(os.listdir(self.destination_path)))
+
+    def test_sync_album_concurrent_downloads_logged_in_order(self):
+        """Test for logging concurrent downloads in album order."""
+
+        class MockPhoto:
+            def __init__(self, filename, delay):
+                self.filename = filename
+                self.id = filename
+                self.versions = {"original": {"size": 1}}
+                self.delay = delay
+
+            def download(self, quality):
+                time.sleep(self.delay)
+                raise icloudpy.exceptions.ICloudPyAPIResponseException(
+                    f"{self.filename} failed", 500
+                )
+
+        class MockAlbum:
+            title = "album"
+            subalbums = {}
+
+            def __iter__(self):
+                # Later photos finish first
+                return iter(
+                    [
+                        MockPhoto("a.JPG", 0.2),
+                        MockPhoto("b.JPG", 0),
+                        MockPhoto("c.JPG", 0.1),
+                    ]
+                )
+
+        files = KeptPaths()
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            with self.assertLogs(logger=LOGGER, level="INFO") as captured:
+                sync_photos.sync_album(
+                    album=MockAlbum(),
+                    destination_path=self.destination_path,
+                    file_sizes=["original"],
+                    files=files,
+                    executor=executor,
+                )
+        failures = [
+            record.getMessage()
+            for record in captured.records
+            if record.levelname == "ERROR"
+        ]
+        self.assertEqual(3, len(failures))
+        for failure, name in zip(failures, ["a", "b", "c"]):
+            self.assertIn(f"{name}.JPG failed", failure)
+        self.assertEqual(3, len(files))
+
+    @patch(target="keyring.get_password", return_value=data.VALID_PASSWORD)
+    @patch(
+        target="src.config_parser.get_username", return_value=data.AUTHENTICATED_USER
+    )
+    @patch("icloudpy.ICloudPyService")
+    @patch("src.read_config")
+    def test_sync_photos_skips_recorded_photos(
+        self,
+        mock_read_config,
+        mock_service,
+        mock_get_username,
+        mock_get_password,
+    ):
+        """Test for skipping photos recorded in the manifest without a stat."""
+        mock_service = self.service
+        config = self.config.copy()
+        config["photos"]["destination"] = self.destination_path
+        mock_read_config.return_value = config
+        sync_photos.sync_photos(config=config, photos=mock_service.photos)
+        with patch.object(sync_photos, "photo_exists") as mocked_exists, patch.object(
+            sync_photos, "fetch_photo"
+        ) as mocked_fetch:
+            sync_photos.sync_photos(config=config, photos=mock_service.photos)
+            mocked_exists.assert_not_called()
+            mocked_fetch.assert_not_called()
+
+        # Photos synced before the manifest existed are checked and recorded once
+        os.remove(os.path.join(tests.TEMP_DIR, MANIFEST_FILE_NAME))
+        sync_photos.sync_photos(config=config, photos=mock_service.photos)
+        with patch.object(sync_photos, "photo_exists") as mocked_exists:
+            sync_photos.sync_photos(config=config, photos=mock_service.photos)
+            mocked_exists.assert_not_called()
+
+    class WatermarkPhoto:
+        """Photo added on the given day."""
+
+        def __init__(self, day):
+            self.id = f"photo-{day}"
+            self.filename = f"photo-{day}.JPG"
+            self.versions = {"original": {"size": 1}}
+            self.added_date = datetime(2022, 1, day, tzinfo=timezone.utc)
+            self.created = datetime(2021, 1, day, tzinfo=timezone.utc)
+
+    class WatermarkAlbum:
+        """Album ordered by added date which honours the paging direction."""
+
+        title = "album"
+        subalbums = {}
+        list_type = "CPLAssetAndMasterByAddedDate"
+
+        def __init__(self, days):
+            self.direction = "ASCENDING"
+            self.days = days
+            self.paged = []
+
+        def __iter__(self):
+            days = sorted(self.days, reverse=self.direction == "DESCENDING")
+            for day in days:
+                self.paged.append(day)
+                yield TestSyncPhotos.WatermarkPhoto(day)
+
+    def test_album_photos_stops_at_watermark(self):
+        """Test for paging an album newest first down to the watermark."""
+        album = TestSyncPhotos.WatermarkAlbum([1, 2, 3, 4])
+        self.assertEqual(
+            [1, 2, 3, 4],
+            [photo.added_date.day for photo in sync_photos.album_photos(album)],
+        )
+        watermark = datetime(2022, 1, 3, tzinfo=timezone.utc).timestamp()
+        album.paged = []
+        self.assertEqual(
+            [4, 3],
+            [
+                photo.added_date.day
+                for photo in sync_photos.album_photos(album, watermark)
+            ],
+        )
+        # Paging stops at the first photo older than the watermark
+        self.assertEqual([4, 3, 2], album.paged)
+        self.assertEqual("ASCENDING", album.direction)
+
+    def test_sort_date_by_asset_date(self):
+        """Test for ordering user albums by the asset date."""
+        album = TestSyncPhotos.WatermarkAlbum([])
+        album.list_type = "CPLContainerRelationLiveByAssetDate"
+        photo = TestSyncPhotos.WatermarkPhoto(2)
+        self.assertEqual(photo.created.timestamp(), sync_photos.sort_date(album, photo))
+
+    def test_sync_album_incremental(self):
+        """Test for syncing only the photos added since the album watermark."""
+        manifest = Manifest(os.path.join(tests.TEMP_DIR, MANIFEST_FILE_NAME))
+        album = TestSyncPhotos.WatermarkAlbum([1, 2])
+
+        def sync(incremental=True):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                sync_photos.sync_album(
+                    album=album,
+                    destination_path=self.destination_path,
+                    file_sizes=["original"],
+                    files=KeptPaths(),
+                    executor=executor,
+                    manifest=manifest,
+                    library="PrimarySync",
+                    incremental=incremental,
+                )
+
+        key = (
+            f"{sync_photos.PHOTOS_WATERMARK_META_KEY}:PrimarySync:"
+            + self.destination_path
+        )
+        try:
+            with patch.object(sync_photos, "fetch_photo", return_value=None):
+                # Without a watermark every photo is synced
+                sync()
+                self.assertEqual(
+                    datetime(2022, 1, 2, tzinfo=timezone.utc).timestamp(),
+                    float(manifest.get_meta(key)),
+                )
+                album.days = [1, 2, 3]
+                album.paged = []
+                sync()
+                self.assertEqual([3, 2, 1], album.paged)
+                self.assertEqual(
+                    datetime(2022, 1, 3, tzinfo=timezone.utc).timestamp(),
+                    float(manifest.get_meta(key)),
+                )
+            # A failed download keeps the watermark for the next sync
+            album.days = [1, 2, 3, 4]
+            with patch.object(sync_photos, "fetch_photo", return_value="failed"):
+                sync()
+            self.assertEqual(
+                datetime(2022, 1, 3, tzinfo=timezone.utc).timestamp(),
+                float(manifest.get_meta(key)),
+            )
+            # A full sync pages the whole album
+            album.paged = []
+            with patch.object(sync_photos, "fetch_photo", return_value=None):
+                sync(incremental=False)
+            self.assertEqual([1, 2, 3, 4], album.paged)
+        finally:
+            manifest.close()
+
+    @patch(target="keyring.get_password", return_value=data.VALID_PASSWORD)
+    @patch(
+        target="src.config_parser.get_username", return_value=data.AUTHENTICATED_USER
+    )
+    @patch("icloudpy.ICloudPyService")
+    @patch("src.read_config")
+    def test_sync_photos_full_sync_interval(
+        self,
+        mock_read_config,
+        mock_service,
+        mock_get_username,
+        mock_get_password,
+    ):
+        """Test for syncing incrementally between full photo syncs."""
+        mock_service = self.service
+        config = self.config.copy()
+        config["photos"]["destination"] = self.destination_path
+        config["photos"]["full_sync_interval"] = 3600
+        config["photos"]["remove_obsolete"] = True
+        mock_read_config.return_value = config
+        watermarks = {}
+
+        def album_photos(album, watermark=None):
+            # The mocked albums can only be paged in ascending order
+            watermarks[album.title] = watermark
+            return iter(album)
+
+        def sync():
+            watermarks.clear()
+            with patch.object(sync_photos, "album_photos", side_effect=album_photos):
+                with self.assertLogs(logger=LOGGER, level="INFO") as captured:
+                    sync_photos.sync_photos(config=config, photos=mock_service.photos)
+            return [record.getMessage() for record in captured.records]
+
+        self.assertIn("Syncing all photos ...", sync())
+        self.assertTrue(all(watermark is None for watermark in watermarks.values()))
+        self.assertIn("album-1", watermarks)
+        obsolete_path = os.path.join(self.destination_path, "obsolete.JPG")
+        with open(obsolete_path, "w", encoding="utf-8") as f:
+            f.write("obsolete")
+        self.assertIn("Syncing photos added since the last sync ...", sync())
+        # Configured albums and the shared library are paged down to a watermark
+        self.assertIsNotNone(watermarks["album-1"])
+        self.assertIsNotNone(watermarks["All Photos"])
+        # Obsolete photos are removed by full syncs only
+        self.assertTrue(os.path.isfile(obsolete_path))
+
+        # Changed filters need a full sync
+        config["photos"]["folder_format"] = "%Y"
+        self.assertIn("Syncing all photos ...", sync())
+        self.assertFalse(os.path.isfile(obsolete_path))
+        self.assertIn("Syncing photos added since the last sync ...", sync())
+
+        # So does an elapsed full sync interval
+        with patch.object(time, "time", return_value=time.time() + 3600):
+            self.assertIn("Syncing all photos ...", sync())
+
+    @patch(target="keyring.get_password", return_value=data.VALID_PASSWORD)
+    @patch(
+        target="src.config_parser.get_username", return_value=data.AUTHENTICATED_USER
+    )
+    @patch("icloudpy.ICloudPyService")
+    @patch("src.read_config")
+    def test_sync_photos_delta_sync(
+        self,
+        mock_read_config,
+        mock_service,
+        mock_get_username,
+        mock_get_password,
+    ):
+        """Test for applying only the photo changes since the last sync."""
+        mock_service = self.service
+        config = self.config.copy()
+        config["photos"]["destination"] = self.destination_path
+        config["photos"]["delta_sync"] = True
+        config["photos"]["remove_obsolete"] = True
+        del config["photos"]["filters"]["albums"]
+        mock_read_config.return_value = config
+        changes = mock_service.photo_changes
+        token_key = f"{sync_photos.PHOTOS_SYNC_TOKEN_META_KEY}:PrimarySync"
+
+        def photo_paths(name):
+            return glob.glob(
+                os.path.join(self.destination_path, "all", f"{name}__original__*")
+            )
+
+        def sync(plan=None):
+            with self.assertLogs(logger=LOGGER, level="INFO") as captured:
+                sync_photos.sync_photos(
+                    config=config, photos=mock_service.photos, plan=plan
+                )
+            return [record.getMessage() for record in captured.records]
+
+        def sync_token():
+            manifest = Manifest(os.path.join(tests.TEMP_DIR, MANIFEST_FILE_NAME))
+            try:
+                return manifest.get_meta(token_key)
+            finally:
+                manifest.close()
+
+        # Without a sync token, every photo is a change
+        self.assertIn("Syncing all photos ...", sync())
+        photo_path = photo_paths("IMG_3328")[0]
+        self.assertEqual(str(len(changes.logs["PrimarySync"])), sync_token())
+
+        with patch.object(sync_photos, "find_obsolete") as mocked_find, patch.object(
+            sync_photos, "fetch_photo"
+        ) as mocked_fetch:
+            self.assertIn("Syncing photos changed since the last sync ...", sync())
+            mocked_find.assert_not_called()
+            mocked_fetch.assert_not_called()
+
+        # Deleted photos are removed without walking the destination
+        changes.delete("PrimarySync", "YN1v8eGiHYYZ/aKUkMuGtSf0P1BN")
+        plan = SyncPlan()
+        sync(plan=plan)
+        # Every file size of the photo is removed
+        self.assertEqual(3, len(plan.deletions))
+        self.assertIn(photo_path, plan.deletions)
+        with patch.object(sync_photos, "find_obsolete") as mocked_find:
+            sync()
+            mocked_find.assert_not_called()
+        self.assertFalse(os.path.isfile(photo_path))
+        self.assertEqual(1, len(photo_paths("IMG_3327")))
+        self.assertEqual(str(len(changes.logs["PrimarySync"])), sync_token())
+
+        # A failed download replays the changes on the next sync
+        token = sync_token()
+        changes.append(
+            "PrimarySync",
+            [
+                record
+                for record in changes.logs["PrimarySync"]
+                if record["recordName"] == "AUxVFT2yVsQ5739tmU5c1497duFD"
+                or record.get("fields", {})
+                .get("masterRef", {})
+                .get("value", {})
+                .get("recordName")
+                == "AUxVFT2yVsQ5739tmU5c1497duFD"
+            ],
+        )
+        os.remove(photo_paths("IMG_3322")[0])
+        with patch.object(sync_photos, "fetch_photo", return_value="failed"):
+            sync()
+        self.assertEqual(token, sync_token())
+        sync()
+        self.assertNotEqual(token, sync_token())
+        self.assertEqual(1, len(photo_paths("IMG_3322")))
+
+        # A photo restored from Recently Deleted comes back without its master
+        asset = next(
+            record
+            for record in changes.logs["PrimarySync"]
+            if record["recordType"] == "CPLAsset"
+            and record["fields"]["masterRef"]["value"]["recordName"]
+            == "ENKzBUr+DdmTaP/GEAglTurWtsen"
+        )
+        deleted_asset = copy.deepcopy(asset)
+        deleted_asset["fields"]["isDeleted"] = {"value": 1, "type": "INT64"}
+        changes.append("PrimarySync", [deleted_asset])
+        sync()
+        self.assertListEqual([], photo_paths("IMG_3327"))
+        changes.append("PrimarySync", [asset])
+        sync()
+        self.assertEqual(1, len(photo_paths("IMG_3327")))
+
+    @patch(target="keyring.get_password", return_value=data.VALID_PASSWORD)
+    @patch(
+        target="src.config_parser.get_username", return_value=data.AUTHENTICATED_USER
+    )
+    @patch("icloudpy.ICloudPyService")
+    @patch("src.read_config")
+    def test_sync_photos_delta_sync_albums(
+        self,
+        mock_read_config,
+        mock_service,
+        mock_get_username,
+        mock_get_password,
+    ):
+        """Test for syncing albums in full despite delta sync."""
+        mock_service = self.service
+        config = self.config.copy()
+        config["photos"]["destination"] = self.destination_path
+        config["photos"]["delta_sync"] = True
+        mock_read_config.return_value = config
+        with patch.object(sync_photos, "LibraryChanges") as mocked_changes:
+            with self.assertLogs(logger=LOGGER, level="WARNING") as captured:
+                sync_photos.sync_photos(config=config, photos=mock_service.photos)
+            mocked_changes.assert_not_called()
+        self.assertIn(
+            "Delta sync does not follow albums, syncing them in full ...",
+            [record.getMessage() for record in captured.records],
+        )
+
+    def test_sync_changes_unwanted_photos(self):
+        """Test for skipping the changed photos of unwanted extensions."""
+        changes = LibraryChanges(library=self.service.photos.libraries["PrimarySync"])
+        self.assertTrue(
+            sync_photos.sync_changes(
+                changes=changes,
+                destination_path=self.destination_path,
+                file_sizes=["original"],
+                extensions=["png"],
+                files=KeptPaths(),
+            )
+        )
+        self.assertListEqual([], os.listdir(self.destination_path))
+
+    @patch(target="keyring.get_password", return_value=data.VALID_PASSWORD)
+    @patch(
+        target="src.config_parser.get_username", return_value=data.AUTHENTICATED_USER
+    )
+    @patch("icloudpy.ICloudPyService")
+    @patch("src.read_config")
+    def test_sync_photos_all_albums_links_photos(
+        self,
+        mock_read_config,
+        mock_service,
+        mock_get_username,
+        mock_get_password,
+    ):
+        """Test for downloading a photo in several albums once."""
+        mock_service = self.service
+        config = self.config.copy()
+        config["photos"]["destination"] = self.destination_path
+        config["photos"]["all_albums"] = True
+        config["photos"]["filters"]["albums"] = None
+        mock_read_config.return_value = config
+        with self.assertLogs(logger=LOGGER, level="INFO") as captured:
+            sync_photos.sync_photos(config=config, photos=mock_service.photos)
+        messages = [record.getMessage() for record in captured.records]
+        linked = [message for message in messages if message.startswith("Linking ")]
+        self.assertGreater(len(linked), 0)
+        album_0_path = os.path.join(self.destination_path, "album 2")
+        album_1_path = os.path.join(self.destination_path, "album-1")
+        shared = set(os.listdir(album_0_path)) & set(os.listdir(album_1_path))
+        self.assertGreater(len(shared), 0)
+        for name in shared:
+            self.assertTrue(
+                os.path.samefile(
+                    os.path.join(album_0_path, name), os.path.join(album_1_path, name)
+                )
+            )
+            # Every photo version is downloaded once
+            self.assertEqual(
+                1,
+                len(
+                    [
+                        message
+                        for message in messages
+                        if message.startswith("Downloading ")
+                        and message.endswith(f"{name} ...")
+                    ]
+                ),
+            )
+
+        # Planning a link transfers nothing
+        os.remove(os.path.join(album_1_path, sorted(shared)[0]))
+        plan = SyncPlan()
+        sync_photos.sync_photos(config=config, photos=mock_service.photos, plan=plan)
+        self.assertEqual(0, plan.summary()["downloads"])
+
+    def test_fetch_photo_keeps_linked_copies(self):
+        """Test for replacing a photo without touching its linked copies."""
+        photo = next(
+            iter(self.service.photos.libraries["PrimarySync"].albums["album-1"])
+        )
+        source_path = os.path.join(self.destination_path, "source.JPG")
+        photo_path = os.path.join(self.destination_path, "photo.JPG")
+        with open(source_path, "wb") as f:
+            f.write(b"previous")
+        self.assertTrue(sync_photos.link_photo(source_path, photo_path))
+
+        def interrupted_copy(source, target):
+            target.write(b"partial")
+            raise ConnectionError("reset")
+
+        with patch.object(
+            sync_photos.shutil, "copyfileobj", side_effect=interrupted_copy
+        ):
+            self.assertEqual(
+                "reset", sync_photos.fetch_photo(photo, "original", photo_path)
+            )
+        self.assertListEqual(
+            ["photo.JPG", "source.JPG"], sorted(os.listdir(self.destination_path))
+        )
+        with open(photo_path, "rb") as f:
+            self.assertEqual(b"previous", f.read())
+        self.assertIsNone(sync_photos.fetch_photo(photo, "original", photo_path))
+        self.assertFalse(os.path.samefile(source_path, photo_path))
+        with open(source_path, "rb") as f:
+            self.assertEqual(b"previous", f.read())
+        with open(photo_path, "rb") as f:
+            self.assertNotEqual(b"previous", f.read())
+
+    def test_link_photo_fallbacks(self):
+        """Test for copying a photo where it cannot be hardlinked."""
+        source_path = os.path.join(self.destination_path, "source.JPG")
+        photo_path = os.path.join(self.destination_path, "photo.JPG")
+        with open(source_path, "wb") as f:
+            f.write(b"photo" * 1000)
+        with patch.object(os, "link", side_effect=OSError("links not supported")):
+            self.assertTrue(sync_photos.link_photo(source_path, photo_path))
+            self.assertFalse(os.path.samefile(source_path, photo_path))
+            with open(photo_path, "rb") as f:
+                self.assertEqual(b"photo" * 1000, f.read())
+            with patch.object(
+                os, "copy_file_range", side_effect=OSError("cross device")
+            ):
+                self.assertTrue(sync_photos.link_photo(source_path, photo_path))
+            with open(photo_path, "rb") as f:
+                self.assertEqual(b"photo" * 1000, f.read())
+        os.remove(source_path)
+        with self.assertLogs(logger=LOGGER, level="ERROR"):
+            self.assertFalse(sync_photos.link_photo(source_path, photo_path))
+
+    def test_process_photo_dry_run_existing_photo(self):
+        """Test for planning to skip an existing photo missing from the manifest."""
+        album = self.service.photos.libraries["PrimarySync"].albums["album-1"]
+        sync_photos.sync_album(
+            album=album, destination_path=self.destination_path, file_sizes=["original"]
+        )
+        plan = SyncPlan()
+        photo = next(iter(album))
+        self.assertFalse(
+            sync_photos.process_photo(
+                photo, "original", self.destination_path, None, None, plan=plan
+            )
+        )
+        self.assertEqual(1, plan.skips)
+
+    def test_version_checksum_unknown(self):
+        """Test for the checksum of a photo without a master record."""
+        self.assertIsNone(sync_photos.version_checksum(object(), "original"))
+
     def test_sync_album_none_album(self):
         """Test if album is None."""
         self.assertIsNone(
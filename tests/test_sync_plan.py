@@ -0,0 +1,52 @@
+"""Tests for sync_plan.py file."""
+__author__ = "Mandar Patil (mandarons@pm.me)"
+
+import unittest
+
+from src import LOGGER
+from src.sync_plan import SyncPlan
+
+
+class TestSyncPlan(unittest.TestCase):
+    """Tests class for sync_plan.py file."""
+
+    def test_empty(self):
+        """Test for a plan with nothing to do."""
+        self.assertDictEqual(
+            {
+                "downloads": 0,
+                "download_bytes": 0,
+                "skips": 0,
+                "deletions": 0,
+                "requests": 0,
+            },
+            SyncPlan().summary(),
+        )
+
+    def test_summary(self):
+        """Test for totals of the planned actions."""
+        plan = SyncPlan()
+        plan.download("/drive/a.pdf", 10, requests=2)
+        plan.download("/drive/empty.txt", None)
+        plan.skip("/drive/b.pdf")
+        plan.delete("/drive/obsolete.pdf")
+        plan.request(3)
+        self.assertListEqual(["/drive/a.pdf", "/drive/empty.txt"], plan.downloads)
+        self.assertListEqual(["/drive/obsolete.pdf"], plan.deletions)
+        with self.assertLogs(logger=LOGGER, level="INFO") as captured:
+            summary = plan.log_summary(name="drive")
+        self.assertDictEqual(
+            {
+                "downloads": 2,
+                "download_bytes": 10,
+                "skips": 1,
+                "deletions": 1,
+                "requests": 6,
+            },
+            summary,
+        )
+        self.assertEqual(
+            "Dry run of drive: 2 downloads (10 bytes), 1 skips, "
+            + "1 deletions and 6 requests.",
+            captured.records[0].getMessage(),
+        )